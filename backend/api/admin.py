@@ -5,7 +5,7 @@ from django.utils.translation import gettext_lazy as _
 from .models import (
     User, Course, Enrollment, Hostel, Room, Occupancy, 
     Club, ClubMembership, Event, EventParticipation,
-    Friend, FriendRequest, Chat, Message, GroupChat
+    Friend, FriendRequest, Chat, Message, GroupChat, ChatReadState, FeedEntry
 )
 
 
@@ -13,7 +13,7 @@ from .models import (
 class UserAdmin(BaseUserAdmin):
     """Admin configuration for the custom User model"""
     list_display = ('id_no', 'name', 'email', 'branch', 'year', 'user_type', 'is_active', 'is_staff')
-    list_filter = ('user_type', 'is_active', 'is_staff')
+    list_filter = ('user_type', 'branch', 'is_active', 'is_staff')
     fieldsets = (
         (None, {'fields': ('id_no', 'password')}),
         (_('Personal info'), {'fields': ('name', 'email')}),
@@ -56,8 +56,8 @@ class HostelAdmin(admin.ModelAdmin):
 
 @admin.register(Room)
 class RoomAdmin(admin.ModelAdmin):
-    list_display = ('id', 'hostel', 'room_number')
-    list_filter = ('hostel',)
+    list_display = ('id', 'hostel', 'room_number', 'floor', 'capacity', 'occupied_beds')
+    list_filter = ('hostel', 'floor')
     search_fields = ('room_number', 'hostel__hostel_name')
 
 
@@ -72,7 +72,7 @@ class OccupancyAdmin(admin.ModelAdmin):
 # Club related models
 @admin.register(Club)
 class ClubAdmin(admin.ModelAdmin):
-    list_display = ('name', 'type')
+    list_display = ('name', 'type', 'members_count', 'leaders_count', 'coordinators_count')
     list_filter = ('type',)
     search_fields = ('name', 'type', 'description')
 
@@ -88,7 +88,7 @@ class ClubMembershipAdmin(admin.ModelAdmin):
 # Event related models
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ('name', 'club', 'date_time', 'location')
+    list_display = ('name', 'club', 'date_time', 'location', 'capacity')
     list_filter = ('club', 'date_time')
     search_fields = ('name', 'description', 'location', 'club__name')
     date_hierarchy = 'date_time'
@@ -96,8 +96,8 @@ class EventAdmin(admin.ModelAdmin):
 
 @admin.register(EventParticipation)
 class EventParticipationAdmin(admin.ModelAdmin):
-    list_display = ('user', 'event', 'registered_at', 'attended')
-    list_filter = ('registered_at', 'attended', 'event')
+    list_display = ('user', 'event', 'registered_at', 'status', 'attended', 'attended_at')
+    list_filter = ('registered_at', 'status', 'attended', 'event')
     search_fields = ('user__id_no', 'user__name', 'event__name')
     date_hierarchy = 'registered_at'
 
@@ -122,7 +122,7 @@ class FriendRequestAdmin(admin.ModelAdmin):
 # Chat related models
 @admin.register(Chat)
 class ChatAdmin(admin.ModelAdmin):
-    list_display = ('chat_id', 'created_at', 'updated_at')
+    list_display = ('chat_id', 'last_message_at', 'created_at', 'updated_at')
     list_filter = ('created_at', 'updated_at')
     date_hierarchy = 'created_at'
     readonly_fields = ('chat_id',)
@@ -141,8 +141,8 @@ class GroupChatAdmin(admin.ModelAdmin):
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'chat', 'sender', 'content_preview', 'date_time', 'is_read')
-    list_filter = ('date_time', 'is_read', 'sender')
+    list_display = ('id', 'chat', 'sender', 'content_preview', 'date_time')
+    list_filter = ('date_time', 'sender')
     search_fields = ('content', 'sender__name', 'sender__id_no')
     date_hierarchy = 'date_time'
     readonly_fields = ('id',)
@@ -152,4 +152,19 @@ class MessageAdmin(admin.ModelAdmin):
         if len(obj.content) > 50:
             return f"{obj.content[:50]}..."
         return obj.content
-    content_preview.short_description = 'Content'
\ No newline at end of file
+    content_preview.short_description = 'Content'
+
+
+@admin.register(ChatReadState)
+class ChatReadStateAdmin(admin.ModelAdmin):
+    list_display = ('chat', 'user', 'last_read_at')
+    search_fields = ('user__id_no', 'user__name')
+    date_hierarchy = 'last_read_at'
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'event', 'event_time', 'score', 'registered', 'from_club', 'friends_going')
+    list_filter = ('registered', 'from_club')
+    search_fields = ('user__id_no', 'user__name', 'event__name')
+    raw_id_fields = ('user', 'event')
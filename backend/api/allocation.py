@@ -0,0 +1,154 @@
+"""
+Room allocation engine for semester intake.
+
+Works entirely in memory on plain ids: callers load the students, the
+vacant rooms and the friendships with a few queries, plan the assignment
+here and write it back in one batch (see Occupancy.allocate).
+"""
+from collections import Counter, defaultdict, deque
+
+
+def friend_groups(student_ids, friendships):
+    """
+    Splits students into groups of friends, i.e. the connected components of
+    the friendship graph restricted to the given students. Members of each
+    group are listed in breadth-first order, so direct friends stay adjacent
+    when a group is too large for one room and has to be split
+    """
+    neighbours = {student_id: [] for student_id in student_ids}
+    for user_id, friend_id in friendships:
+        if user_id in neighbours and friend_id in neighbours and user_id != friend_id:
+            neighbours[user_id].append(friend_id)
+            neighbours[friend_id].append(user_id)
+
+    groups = []
+    seen = set()
+    for student_id in student_ids:
+        if student_id in seen:
+            continue
+        seen.add(student_id)
+        group = []
+        queue = deque([student_id])
+        while queue:
+            current = queue.popleft()
+            group.append(current)
+            for neighbour in neighbours[current]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+        groups.append(group)
+    return groups
+
+
+class _RoomPool:
+    """
+    Rooms bucketed by number of free beds, so finding the best fitting room
+    for a group costs at most one lookup per possible bed count
+    """
+    def __init__(self, max_beds):
+        self.max_beds = max_beds
+        self.buckets = defaultdict(list)
+
+    def push(self, room_id, free_beds):
+        if free_beds > 0:
+            self.buckets[free_beds].append(room_id)
+
+    def take_fit(self, size):
+        """
+        Removes and returns (room_id, free_beds) for the room with the fewest
+        free beds that still fits size, or None
+        """
+        for free_beds in range(size, self.max_beds + 1):
+            if self.buckets[free_beds]:
+                return self.buckets[free_beds].pop(), free_beds
+        return None
+
+    def take_largest(self):
+        for free_beds in range(self.max_beds, 0, -1):
+            if self.buckets[free_beds]:
+                return self.buckets[free_beds].pop(), free_beds
+        return None
+
+    def drain(self):
+        for free_beds, room_ids in self.buckets.items():
+            for room_id in room_ids:
+                yield room_id, free_beds
+        self.buckets.clear()
+
+
+def allocate_rooms(student_ids, rooms, friendships=(), year_of=None):
+    """
+    Plans a complete assignment of students to rooms.
+
+    student_ids is the ordered list of students to place and rooms a list of
+    (room_id, free_beds) in order of preference. Friends (pairs from
+    friendships) are placed in the same room whenever the group fits in one.
+    If year_of is given, students are grouped by year: each year fills its
+    own rooms and only spills into rooms started by another year once empty
+    rooms run out. Groups are placed largest first into the best fitting
+    room, which keeps beds from being fragmented.
+
+    Returns (assignments, unplaced) where assignments maps student id to
+    room id and unplaced lists the students left over when beds ran out.
+    """
+    assignments = {}
+    unplaced = []
+    max_beds = max((free_beds for _, free_beds in rooms), default=0)
+
+    # Rooms nobody has been placed in by this run, in order of preference
+    fresh = _RoomPool(max_beds)
+    for room_id, free_beds in reversed(rooms):
+        fresh.push(room_id, free_beds)
+    # Rooms partially filled by a previous year
+    leftover = _RoomPool(max_beds)
+
+    groups = friend_groups(student_ids, friendships)
+    by_year = defaultdict(list)
+    for group in groups:
+        year = None
+        if year_of is not None:
+            years = Counter(year_of(student_id) for student_id in group)
+            # A mixed group joins the year most of its members belong to
+            year = max(years.items(), key=lambda item: (item[1], -(item[0] or 0)))[0]
+        by_year[year].append(group)
+
+    for year in sorted(by_year, key=lambda year: (year is None, year or 0)):
+        # Rooms partially filled by this year
+        current = _RoomPool(max_beds)
+        pools = (current, fresh, leftover)
+
+        chunks = []
+        for group in by_year[year]:
+            # A group larger than any room is split into room-sized chunks
+            step = max(max_beds, 1)
+            chunks.extend(group[i:i + step] for i in range(0, len(group), step))
+        chunks.sort(key=len, reverse=True)
+
+        for chunk in chunks:
+            remaining = chunk
+            while remaining:
+                room = None
+                for pool in pools:
+                    room = pool.take_fit(len(remaining))
+                    if room:
+                        break
+                else:
+                    # Nothing fits the whole chunk, so fill the largest room left
+                    for pool in pools:
+                        room = pool.take_largest()
+                        if room:
+                            break
+                if not room:
+                    unplaced.extend(remaining)
+                    break
+
+                room_id, free_beds = room
+                placed, remaining = remaining[:free_beds], remaining[free_beds:]
+                for student_id in placed:
+                    assignments[student_id] = room_id
+                current.push(room_id, free_beds - len(placed))
+
+        for room_id, free_beds in current.drain():
+            leftover.push(room_id, free_beds)
+
+    return assignments, unplaced
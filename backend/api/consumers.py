@@ -0,0 +1,195 @@
+import asyncio
+import json
+import re
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+from django.core.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Chat
+from .serializers.chat_serializers import MessageSerializer
+
+
+def chat_group_name(chat_id):
+    """
+    Returns the channel layer group that receives events for a chat
+    """
+    return f"chat_{chat_id}"
+
+
+def user_group_name(user_id):
+    """
+    Returns the channel layer group that reaches every connection of a user
+    """
+    # Group names may only contain ASCII letters, digits, hyphens, underscores and periods
+    return f"user_{re.sub(r'[^A-Za-z0-9_.-]', '_', str(user_id))}"
+
+
+def subscribe_user(user_id, chat_id):
+    """
+    Attaches every live connection of a user to a chat they have been added
+    to or created, so they receive its messages without reconnecting
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        user_group_name(user_id),
+        {'type': 'chat.subscribe', 'chat_id': str(chat_id)}
+    )
+
+
+def unsubscribe_user(user_id, chat_id):
+    """
+    Detaches every live connection of a user from a chat, once they have
+    been removed from it or left it, so they stop receiving its messages
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        user_group_name(user_id),
+        {'type': 'chat.unsubscribe', 'chat_id': str(chat_id)}
+    )
+
+
+def broadcast_message(message):
+    """
+    Pushes a newly created message to every connection subscribed to its chat.
+    The payload is reduced to plain JSON types so any channel layer backend
+    can carry it across processes
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    payload = json.loads(json.dumps(MessageSerializer(message).data, cls=JSONEncoder))
+    async_to_sync(channel_layer.group_send)(
+        chat_group_name(message.chat_id),
+        {'type': 'chat.message', 'message': payload}
+    )
+
+
+class ChatListener:
+    """
+    Short-lived channel layer subscription to a set of chats, used by
+    long-poll requests to sleep until a message arrives instead of
+    repeatedly querying the database
+    """
+    def __init__(self, chat_ids):
+        self.groups = [chat_group_name(chat_id) for chat_id in chat_ids]
+        self.channel_layer = get_channel_layer()
+        self.channel_name = None
+
+    async def subscribe(self):
+        if self.channel_layer is None:
+            return
+        self.channel_name = await self.channel_layer.new_channel()
+        for group in self.groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+
+    async def wait(self, timeout):
+        """
+        Waits up to timeout seconds for a chat event; returns True if one arrived
+        """
+        if self.channel_name is None:
+            return False
+        try:
+            await asyncio.wait_for(self.channel_layer.receive(self.channel_name), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def unsubscribe(self):
+        if self.channel_name is None:
+            return
+        for group in self.groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.channel_name = None
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    WebSocket consumer that pushes new messages to chat participants.
+
+    On connect the user is subscribed to every chat they take part in, and
+    chats they are added to or leave later are followed through their user
+    group. Clients can also subscribe to a chat explicitly by sending
+    {"action": "subscribe", "chat_id": "<chat id>"}
+    """
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.user = user
+        self.chat_groups = set()
+        self.user_group = user_group_name(user.pk)
+        await self.accept()
+        await self.channel_layer.group_add(self.user_group, self.channel_name)
+
+        for chat_id in await self.get_chat_ids():
+            await self.join_chat(chat_id)
+
+    async def disconnect(self, code):
+        for group in getattr(self, 'chat_groups', set()):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        if hasattr(self, 'user_group'):
+            await self.channel_layer.group_discard(self.user_group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if content.get('action') != 'subscribe':
+            await self.send_json({'error': 'Unknown action.'})
+            return
+
+        chat_id = content.get('chat_id')
+        if not chat_id or not await self.is_participant(chat_id):
+            await self.send_json({'error': 'You are not a participant in this chat.'})
+            return
+
+        await self.join_chat(chat_id)
+        await self.send_json({'subscribed': str(chat_id)})
+
+    async def join_chat(self, chat_id):
+        group = chat_group_name(chat_id)
+        if group not in self.chat_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.chat_groups.add(group)
+
+    async def chat_message(self, event):
+        """
+        Handles 'chat.message' events sent through the channel layer
+        """
+        await self.send_json({'type': 'message', 'message': event['message']})
+
+    async def chat_subscribe(self, event):
+        """
+        Handles 'chat.subscribe' events sent when the user joins a chat
+        """
+        await self.join_chat(event['chat_id'])
+        await self.send_json({'type': 'subscribed', 'chat_id': event['chat_id']})
+
+    async def chat_unsubscribe(self, event):
+        """
+        Handles 'chat.unsubscribe' events sent when the user leaves a chat
+        """
+        group = chat_group_name(event['chat_id'])
+        if group in self.chat_groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+            self.chat_groups.discard(group)
+        await self.send_json({'type': 'unsubscribed', 'chat_id': event['chat_id']})
+
+    @database_sync_to_async
+    def get_chat_ids(self):
+        return list(Chat.objects.filter(participants=self.user).values_list('chat_id', flat=True))
+
+    @database_sync_to_async
+    def is_participant(self, chat_id):
+        try:
+            return Chat.objects.filter(chat_id=chat_id, participants=self.user).exists()
+        except ValidationError:
+            # Malformed chat ids are treated like chats the user is not in
+            return False
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored branch of every user from their course enrollments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of users to refresh per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            self.stdout.write(self.style.ERROR('Batch size must be positive'))
+            return
+
+        user_ids = User.objects.order_by('id_no').values_list('id_no', flat=True)
+        total = 0
+        batch = []
+
+        for user_id in user_ids.iterator(chunk_size=batch_size):
+            batch.append(user_id)
+            if len(batch) >= batch_size:
+                User.objects.refresh_branches(batch)
+                total += len(batch)
+                batch = []
+
+        if batch:
+            User.objects.refresh_branches(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Refreshed branch for {total} users'))
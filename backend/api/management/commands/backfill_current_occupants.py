@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from api.models import Occupancy
+
+
+class Command(BaseCommand):
+    help = 'Sets current_occupant on open occupancies created before the occupancy history'
+
+    def handle(self, *args, **options):
+        updated = Occupancy.objects.current().filter(
+            current_occupant__isnull=True
+        ).update(current_occupant=F('occupant'))
+
+        self.stdout.write(self.style.SUCCESS(f'Set current_occupant on {updated} occupancies'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from api.models import Chat
+
+
+class Command(BaseCommand):
+    help = 'Sets the canonical direct_key on existing direct (non-group) chats'
+
+    def handle(self, *args, **options):
+        chats = Chat.objects.filter(
+            direct_key__isnull=True, group_info__isnull=True
+        ).prefetch_related('participants')
+
+        updated = 0
+        for chat in chats.iterator(chunk_size=500):
+            participant_ids = [p.id_no for p in chat.participants.all()]
+            if len(participant_ids) != 2:
+                self.stdout.write(self.style.WARNING(
+                    f'Skipping chat {chat.chat_id}: {len(participant_ids)} participants'
+                ))
+                continue
+
+            direct_key = Chat.make_direct_key(*participant_ids)
+            try:
+                with transaction.atomic():
+                    Chat.objects.filter(chat_id=chat.chat_id).update(direct_key=direct_key)
+                updated += 1
+            except IntegrityError:
+                self.stdout.write(self.style.WARNING(
+                    f'Skipping chat {chat.chat_id}: duplicate direct chat for {direct_key}'
+                ))
+
+        self.stdout.write(self.style.SUCCESS(f'Set direct_key on {updated} chats'))
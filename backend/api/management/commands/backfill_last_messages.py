@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.models import Chat
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the last message snapshot of every chat'
+
+    def handle(self, *args, **options):
+        total = 0
+        for chat in Chat.objects.only('chat_id').iterator():
+            chat.refresh_last_message()
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Refreshed last message for {total} chats'))
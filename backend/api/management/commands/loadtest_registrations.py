@@ -0,0 +1,121 @@
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, connection
+from django.db.models import Sum
+from django.utils import timezone
+from api.models import Club, Event, EventParticipation, User
+
+
+class Command(BaseCommand):
+    help = ('Load tests event registration: many students register concurrently for one '
+            'capped event, some then unregister, and seat and waitlist invariants are checked')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--capacity', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--unregister', type=int, default=50,
+                            help='Registered students who unregister afterwards, promoting the waitlist')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the generated users, club and event')
+
+    def run_concurrently(self, items, threads, work):
+        """
+        Runs work(item) for every item on the given number of threads, each
+        with its own database connection. Returns the results and the elapsed time
+        """
+        results = []
+        lock = threading.Lock()
+
+        def worker(chunk):
+            try:
+                for item in chunk:
+                    result = work(item)
+                    with lock:
+                        results.append(result)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(items[i::threads],)) for i in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        students, capacity, threads = options['students'], options['capacity'], options['threads']
+        prefix = f"LT{uuid.uuid4().hex[:6].upper()}"
+
+        User.objects.bulk_create([
+            User(id_no=f'{prefix}{i:06d}', email=f'{prefix.lower()}.{i}@loadtest.invalid',
+                 name=f'Load test {i}')
+            for i in range(students)
+        ], batch_size=1000)
+        club = Club.objects.create(name=f'Load test {prefix}', type='Load test')
+        event = Event.objects.create(
+            name=f'Load test {prefix}', club=club, location='Load test',
+            date_time=timezone.now() + timedelta(days=1), capacity=capacity
+        )
+        user_ids = list(User.objects.filter(id_no__startswith=prefix).values_list('id_no', flat=True))
+
+        def register(user_id):
+            try:
+                return EventParticipation.register(event, user_id).status
+            except IntegrityError:
+                return 'error'
+
+        try:
+            results, elapsed = self.run_concurrently(user_ids, threads, register)
+            outcome = Counter(results)
+            self.stdout.write(
+                f"{students} registrations on {threads} threads in {elapsed:.2f}s "
+                f"({students / elapsed:.0f}/s): {outcome['registered']} registered, "
+                f"{outcome['waitlisted']} waitlisted, {outcome['error']} errors"
+            )
+
+            waitlist = list(EventParticipation.objects.filter(
+                event=event, status='waitlisted'
+            ).order_by('registered_at', 'id').values_list('pk', flat=True))
+            leavers = list(EventParticipation.objects.filter(
+                event=event, status='registered'
+            ).values_list('pk', flat=True)[:options['unregister']])
+
+            def unregister(pk):
+                EventParticipation.objects.get(pk=pk).delete()
+
+            _, elapsed = self.run_concurrently(leavers, threads, unregister)
+            self.stdout.write(f"{len(leavers)} unregistrations in {elapsed:.2f}s")
+
+            registered = EventParticipation.objects.filter(event=event, status='registered').count()
+            taken = event.seat_counters.aggregate(taken=Sum('taken'))['taken']
+            promoted = set(EventParticipation.objects.filter(
+                pk__in=waitlist, status='registered'
+            ).values_list('pk', flat=True))
+
+            expected = min(capacity, students - len(leavers))
+            errors = []
+            if registered != expected:
+                errors.append(f'{registered} registered, expected {expected}')
+            if taken != registered:
+                errors.append(f'seat counters hold {taken} seats for {registered} registrations')
+            if promoted != set(waitlist[:len(promoted)]):
+                errors.append('waitlist was not promoted in registration order')
+
+            if errors:
+                for error in errors:
+                    self.stdout.write(self.style.ERROR(error))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'OK: {registered} registered, {len(promoted)} promoted from the waitlist'
+                ))
+        finally:
+            if not options['keep']:
+                club.delete()
+                User.objects.filter(id_no__startswith=prefix).delete()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from api.models import FeedEntry, User
+
+
+class Command(BaseCommand):
+    help = ("Recomputes users' upcoming-events feeds from memberships, friendships and "
+            "participations and drops entries of past events. Run with --prune-only "
+            "periodically (e.g. daily from cron) to keep the feed table small")
+
+    def add_arguments(self, parser):
+        parser.add_argument('users', nargs='*', help='ID numbers of the users to rebuild (default all)')
+        parser.add_argument('--prune-only', action='store_true',
+                            help='Only delete the entries of past events, in one statement')
+
+    def handle(self, *args, **options):
+        if options['prune_only']:
+            deleted = FeedEntry.prune_past()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} past feed entries'))
+            return
+
+        users = User.objects.all()
+        if options['users']:
+            users = users.filter(id_no__in=options['users'])
+
+        count = 0
+        for user_id in users.values_list('id_no', flat=True).iterator(chunk_size=1000):
+            FeedEntry.rebuild(user_id)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the feeds of {count} users'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from api.models import Club, ClubMembership
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the member and per-role counters of every club from its memberships'
+
+    def handle(self, *args, **options):
+        def count(**filters):
+            memberships = ClubMembership.objects.filter(
+                club=OuterRef('pk'), **filters
+            ).order_by().values('club').annotate(n=Count('pk')).values('n')
+            return Coalesce(Subquery(memberships, output_field=IntegerField()), Value(0))
+
+        updates = {'members_count': count()}
+        for role, field in Club.ROLE_COUNTERS.items():
+            updates[field] = count(role=role)
+        updated = Club.objects.update(**updates)
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted members for {updated} clubs'))
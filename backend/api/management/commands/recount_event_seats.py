@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the seat counters of capped events from their registrations and promotes waitlists'
+
+    def handle(self, *args, **options):
+        events = Event.objects.filter(capacity__isnull=False)
+
+        count = 0
+        for event in events.iterator(chunk_size=500):
+            event.sync_seat_counters()
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt seat counters for {count} events'))
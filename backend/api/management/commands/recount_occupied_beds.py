@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from api.models import Occupancy, Room
+from api.models.hostel import invalidate_occupancy_dashboard
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the occupied beds counter of every room from active occupancies'
+
+    def handle(self, *args, **options):
+        active_count = Occupancy.objects.filter(
+            room=OuterRef('pk'), to_date__isnull=True
+        ).order_by().values('room').annotate(n=Count('pk')).values('n')
+
+        updated = Room.objects.update(occupied_beds=Coalesce(
+            Subquery(active_count, output_field=IntegerField()), Value(0)
+        ))
+        invalidate_occupancy_dashboard()
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted occupied beds for {updated} rooms'))
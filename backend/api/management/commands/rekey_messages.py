@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, Q, Value, When
+from api.models import Message
+from api.utils import uuid7
+
+
+class Command(BaseCommand):
+    help = ('Replaces the random uuid4 ids of existing messages with time-ordered '
+            'uuid7 ids derived from their send time')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of messages to rekey per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            self.stdout.write(self.style.ERROR('Batch size must be positive'))
+            return
+
+        # Messages are not referenced by other tables, so their ids can be
+        # rewritten in place. Chats keep their existing ids; only new chats
+        # get uuid7 ids. Messages are walked in (date_time, id) keyset chunks,
+        # so memory stays flat, and each chunk is rewritten by one UPDATE.
+        messages = Message.objects.order_by('date_time', 'id').values_list('id', 'date_time')
+        rekeyed = 0
+        cursor = None
+        while True:
+            chunk = messages
+            if cursor is not None:
+                chunk = chunk.filter(
+                    Q(date_time__gt=cursor[1]) | Q(date_time=cursor[1], id__gt=cursor[0])
+                )
+            rows = list(chunk[:batch_size])
+            if not rows:
+                break
+            cursor = rows[-1]
+
+            new_ids = {
+                message_id: uuid7(int(date_time.timestamp() * 1000))
+                for message_id, date_time in rows
+                if message_id.version != 7
+            }
+            if new_ids:
+                with transaction.atomic():
+                    Message.objects.filter(id__in=new_ids).update(id=Case(
+                        *[When(id=message_id, then=Value(new_id)) for message_id, new_id in new_ids.items()],
+                        output_field=models.UUIDField()
+                    ))
+                rekeyed += len(new_ids)
+                self.stdout.write(f'Rekeyed {rekeyed} messages')
+
+        self.stdout.write(self.style.SUCCESS(f'Rekeyed {rekeyed} messages'))
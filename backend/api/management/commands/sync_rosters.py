@@ -0,0 +1,46 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Enrollment
+
+
+class Command(BaseCommand):
+    help = ('Syncs course enrollments with authoritative rosters from a CSV file '
+            'with course_id and user_id columns')
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', type=str, help='Path to the roster CSV file')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the changes without applying them')
+
+    def handle(self, *args, **options):
+        rosters = {}
+        try:
+            with open(options['csv_file'], newline='') as f:
+                reader = csv.DictReader(f)
+                if not reader.fieldnames or not {'course_id', 'user_id'} <= set(reader.fieldnames):
+                    raise CommandError('CSV file must have course_id and user_id columns')
+                for row in reader:
+                    rosters.setdefault(row['course_id'].strip(), []).append(row['user_id'].strip())
+        except OSError as e:
+            raise CommandError(f'Could not read {options["csv_file"]}: {e}')
+
+        report = Enrollment.sync_rosters(rosters, dry_run=options['dry_run'])
+
+        for course_id, course_report in report['courses'].items():
+            self.stdout.write(
+                f"{course_id}: +{len(course_report['added'])} "
+                f"-{len(course_report['dropped'])} "
+                f"={course_report['unchanged']}"
+            )
+            if course_report['unknown_users']:
+                self.stdout.write(self.style.WARNING(
+                    f"  Unknown users: {', '.join(course_report['unknown_users'])}"
+                ))
+        for course_id in report['unknown_courses']:
+            self.stdout.write(self.style.WARNING(f'{course_id}: course not found'))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Dry run complete, no changes applied'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Rosters synced'))
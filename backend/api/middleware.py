@@ -0,0 +1,49 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed, TokenError
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    """
+    Validates a SimpleJWT access token and returns its user,
+    or an AnonymousUser if the token is missing or invalid
+    """
+    if not raw_token:
+        return AnonymousUser()
+    authentication = JWTAuthentication()
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(validated_token)
+    except (InvalidToken, AuthenticationFailed, TokenError):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware:
+    """
+    ASGI middleware that authenticates WebSocket connections with the same
+    SimpleJWT access tokens used by the REST API.
+    Browsers cannot set headers on WebSocket requests, so the token is read
+    from the 'token' query parameter, falling back to the Authorization header
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        scope['user'] = await get_user_for_token(self.get_raw_token(scope))
+        return await self.app(scope, receive, send)
+
+    def get_raw_token(self, scope):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        if query.get('token'):
+            return query['token'][0]
+
+        headers = dict(scope.get('headers', []))
+        auth_header = headers.get(b'authorization', b'').decode().split()
+        if len(auth_header) == 2 and auth_header[0] == 'Bearer':
+            return auth_header[1]
+        return None
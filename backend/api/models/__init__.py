@@ -3,9 +3,10 @@ from .user import User
 from .course import Course, Enrollment  # Make sure Enrollment is imported here
 from .hostel import Hostel, Room, Occupancy
 from .club import Club, ClubMembership
-from .event import Event, EventParticipation
+from .event import Event, EventParticipation, EventSeatCounter
 from .friend import Friend, FriendRequest
-from .chat import Chat, Message, GroupChat
+from .chat import Chat, Message, GroupChat, ChatReadState
+from .feed import FeedEntry
 
 # Export all models
 __all__ = [
@@ -13,7 +14,8 @@ __all__ = [
     'Course', 'Enrollment',
     'Hostel', 'Room', 'Occupancy',
     'Club', 'ClubMembership',
-    'Event', 'EventParticipation',
+    'Event', 'EventParticipation', 'EventSeatCounter',
     'Friend', 'FriendRequest',
-    'Chat', 'Message', 'GroupChat'
+    'Chat', 'Message', 'GroupChat', 'ChatReadState',
+    'FeedEntry'
 ]
\ No newline at end of file
@@ -1,39 +1,102 @@
 from django.db import models
-import uuid
+from django.db.models import Count, F, FilteredRelation, Q
+from ..utils import uuid7
 
 
 class Chat(models.Model):
     """
     Chat model representing conversations between friends
     """
-    chat_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    chat_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     participants = models.ManyToManyField('User', related_name='chats')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Snapshot of the latest message, so listing chats needs no per-chat queries
+    last_message_preview = models.CharField(max_length=255, blank=True, default='')
+    last_message_sender_name = models.CharField(max_length=255, blank=True, default='')
+    last_message_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    
+    # Canonical "<smaller id>:<larger id>" key for direct chats (null for group chats).
+    # Being unique, it makes finding a DM a single index lookup and stops
+    # concurrent requests from creating duplicate direct chats
+    direct_key = models.CharField(max_length=41, unique=True, null=True, blank=True, editable=False)
+    
+    PREVIEW_LENGTH = 255
+    
     def __str__(self):
         participants_str = ", ".join([p.name for p in self.participants.all()[:3]])
         if self.participants.count() > 3:
             participants_str += f" and {self.participants.count() - 3} more"
         return f"Chat between {participants_str}"
+    
+    @staticmethod
+    def make_direct_key(user_id, other_user_id):
+        """
+        Returns the canonical direct chat key for a pair of user ids
+        """
+        return ":".join(sorted([user_id, other_user_id]))
+    
+    @classmethod
+    def last_message_fields(cls, message):
+        """
+        Returns the snapshot field values describing the given message
+        """
+        if message is None:
+            return {
+                'last_message_preview': '',
+                'last_message_sender_name': '',
+                'last_message_at': None,
+            }
+        return {
+            'last_message_preview': message.content[:cls.PREVIEW_LENGTH],
+            'last_message_sender_name': message.sender.name,
+            'last_message_at': message.date_time,
+        }
+    
+    def refresh_last_message(self):
+        """
+        Recomputes the last message snapshot from the chat's messages
+        """
+        latest = self.messages.select_related('sender').order_by('-date_time', '-id').first()
+        fields = self.last_message_fields(latest)
+        Chat.objects.filter(chat_id=self.chat_id).update(**fields)
+        for name, value in fields.items():
+            setattr(self, name, value)
 
 
 class Message(models.Model):
     """
     Message model representing individual messages in a chat
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey('User', on_delete=models.CASCADE, related_name='sent_messages')
     content = models.TextField()
     date_time = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['date_time']
+        indexes = [
+            # Serves paged message history; InnoDB appends the primary key to
+            # secondary indexes, so this also covers the (date_time, id) cursor
+            models.Index(fields=['chat', 'date_time'], name='message_chat_date_idx'),
+        ]
     
     def __str__(self):
         return f"Message from {self.sender.name} at {self.date_time.strftime('%Y-%m-%d %H:%M')}"
+    
+    def delete(self, *args, **kwargs):
+        """
+        Override delete to refresh the chat's last message snapshot
+        when the latest message is removed
+        """
+        chat = self.chat
+        was_latest = chat.last_message_at is not None and self.date_time >= chat.last_message_at
+        result = super().delete(*args, **kwargs)
+        if was_latest:
+            chat.refresh_last_message()
+        return result
 
 
 class GroupChat(models.Model):
@@ -45,4 +108,52 @@ class GroupChat(models.Model):
     admin = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, related_name='administered_chats')
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class ChatReadState(models.Model):
+    """
+    Per-participant read cursor for a chat.
+    Every message in the chat up to last_read_at counts as read by the user
+    """
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='chat_read_states')
+    last_read_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('chat', 'user')  # One read cursor per participant
+    
+    def __str__(self):
+        return f"{self.user.name} read {self.chat_id} up to {self.last_read_at.strftime('%Y-%m-%d %H:%M')}"
+    
+    @classmethod
+    def advance(cls, chat_id, user, read_at):
+        """
+        Moves the user's read cursor forward to read_at; never moves it back.
+        Returns True if the cursor changed
+        """
+        if cls.objects.filter(chat_id=chat_id, user=user, last_read_at__lt=read_at).update(last_read_at=read_at):
+            return True
+        _, created = cls.objects.get_or_create(
+            chat_id=chat_id, user=user, defaults={'last_read_at': read_at}
+        )
+        return created
+    
+    @classmethod
+    def unread_counts(cls, user):
+        """
+        Returns {chat_id: unread message count} for every chat the user takes
+        part in that has unread messages, computed in a single grouped query
+        """
+        rows = (Message.objects
+                .annotate(read_state=FilteredRelation(
+                    'chat__read_states', condition=Q(chat__read_states__user=user)
+                ))
+                .filter(chat__participants=user)
+                .exclude(sender=user)
+                .filter(Q(read_state__last_read_at__isnull=True) |
+                        Q(date_time__gt=F('read_state__last_read_at')))
+                .order_by()
+                .values('chat_id')
+                .annotate(unread=Count('id')))
+        return {row['chat_id']: row['unread'] for row in rows}
@@ -1,4 +1,9 @@
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from .feed import FeedEntry
 
 
 class Club(models.Model):
@@ -9,9 +14,55 @@ class Club(models.Model):
     type = models.CharField(max_length=50)  # e.g., Technical, Cultural, Sports
     description = models.TextField(blank=True)
     members = models.ManyToManyField('User', through='ClubMembership', related_name='clubs')
+    # Counters of memberships, maintained by ClubMembership so listing clubs
+    # never counts members (see recount_club_members to repair drift)
+    members_count = models.PositiveIntegerField(default=0, editable=False)
+    leaders_count = models.PositiveIntegerField(default=0, editable=False)
+    coordinators_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Counter field for each role that has one; plain members are the rest
+    ROLE_COUNTERS = {
+        'leader': 'leaders_count',
+        'coordinator': 'coordinators_count',
+    }
     
     def __str__(self):
         return self.name
+    
+    @property
+    def role_counts(self):
+        return {
+            'member': max(0, self.members_count - self.leaders_count - self.coordinators_count),
+            'leader': self.leaders_count,
+            'coordinator': self.coordinators_count,
+        }
+    
+    @staticmethod
+    def adjusted(field, delta):
+        """
+        Expression adding delta to an unsigned counter. Decrements stop at 0,
+        so counters that were never backfilled cannot underflow
+        """
+        if delta > 0:
+            return F(field) + delta
+        # GREATEST first, so no intermediate value is negative
+        return Greatest(F(field), Value(-delta)) + delta
+    
+    @classmethod
+    def adjust_member_counts(cls, club_id, role_deltas):
+        """
+        Applies {role: change in memberships} to a club's counters in one UPDATE
+        """
+        updates = {}
+        total = sum(role_deltas.values())
+        if total:
+            updates['members_count'] = cls.adjusted('members_count', total)
+        for role, delta in role_deltas.items():
+            field = cls.ROLE_COUNTERS.get(role)
+            if field and delta:
+                updates[field] = cls.adjusted(field, delta)
+        if updates:
+            cls.objects.filter(pk=club_id).update(**updates)
 
 
 class ClubMembership(models.Model):
@@ -31,6 +82,76 @@ class ClubMembership(models.Model):
     
     class Meta:
         unique_together = ('user', 'club')  # A user can be part of a club only once
+        indexes = [
+            # Roster pages filtered by role
+            models.Index(fields=['club', 'role'], name='clubmembership_club_role_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.name} - {self.club.name} ({self.get_role_display()})"
\ No newline at end of file
+        return f"{self.user.name} - {self.club.name} ({self.get_role_display()})"
+    
+    def save(self, *args, **kwargs):
+        """
+        Override save to keep the club's member counters in sync, in the same
+        transaction as the membership change, and refresh the member's feed
+        """
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = ClubMembership.objects.filter(pk=self.pk).values('club_id', 'role', 'user_id').first()
+            super().save(*args, **kwargs)
+            
+            if previous is None:
+                Club.adjust_member_counts(self.club_id, {self.role: 1})
+            elif previous['club_id'] != self.club_id:
+                Club.adjust_member_counts(previous['club_id'], {previous['role']: -1})
+                Club.adjust_member_counts(self.club_id, {self.role: 1})
+            elif previous['role'] != self.role:
+                Club.adjust_member_counts(self.club_id, {previous['role']: -1, self.role: 1})
+            
+            ClubMembership.invalidate_roles(self.user_id)
+            if previous and previous['user_id'] != self.user_id:
+                ClubMembership.invalidate_roles(previous['user_id'])
+            
+            if previous is None or (previous['user_id'], previous['club_id']) != (self.user_id, self.club_id):
+                FeedEntry.membership_changed(self.user_id, self.club_id)
+                if previous:
+                    FeedEntry.membership_changed(previous['user_id'], previous['club_id'])
+    
+    def delete(self, *args, **kwargs):
+        """
+        Override delete to keep the club's member counters in sync and
+        refresh the member's feed
+        """
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Club.adjust_member_counts(self.club_id, {self.role: -1})
+            ClubMembership.invalidate_roles(self.user_id)
+            FeedEntry.membership_changed(self.user_id, self.club_id)
+        return result
+    
+    @staticmethod
+    def roles_cache_key(user_id):
+        return f"club_roles:{user_id}"
+    
+    @classmethod
+    def roles_for_user(cls, user_id):
+        """
+        Returns {club_id: role} for every club the user belongs to, from one
+        query, cached for CLUB_ROLES_CACHE_TIMEOUT seconds
+        """
+        key = cls.roles_cache_key(user_id)
+        roles = cache.get(key) if settings.CLUB_ROLES_CACHE_TIMEOUT else None
+        if roles is None:
+            roles = dict(cls.objects.filter(user_id=user_id).values_list('club_id', 'role'))
+            if settings.CLUB_ROLES_CACHE_TIMEOUT:
+                cache.set(key, roles, settings.CLUB_ROLES_CACHE_TIMEOUT)
+        return roles
+    
+    @classmethod
+    def invalidate_roles(cls, user_id):
+        """
+        Drops the user's cached club roles once the current transaction commits
+        """
+        key = cls.roles_cache_key(user_id)
+        transaction.on_commit(lambda: cache.delete(key))
\ No newline at end of file
@@ -27,6 +27,17 @@ class Course(models.Model):
         if dept_match:
             self.department = dept_match.group(1).upper()
         super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        """
+        Override delete to refresh the stored branch of the enrolled students,
+        since their enrollments are removed along with the course
+        """
+        from .user import User  # Import here to avoid circular import
+        student_ids = list(self.enrollment_set.values_list('user_id', flat=True))
+        result = super().delete(*args, **kwargs)
+        User.objects.refresh_branches(student_ids)
+        return result
 
 
 class Enrollment(models.Model):
@@ -41,4 +52,78 @@ class Enrollment(models.Model):
         unique_together = ('user', 'course')  # A user can enroll in a course only once
     
     def __str__(self):
-        return f"{self.user.name} enrolled in {self.course.course_id}"
\ No newline at end of file
+        return f"{self.user.name} enrolled in {self.course.course_id}"
+    
+    def save(self, *args, **kwargs):
+        """
+        Override save to keep the user's stored branch in sync
+        """
+        super().save(*args, **kwargs)
+        from .user import User  # Import here to avoid circular import
+        User.objects.refresh_branches([self.user_id])
+    
+    def delete(self, *args, **kwargs):
+        """
+        Override delete to keep the user's stored branch in sync
+        """
+        user_id = self.user_id
+        result = super().delete(*args, **kwargs)
+        from .user import User  # Import here to avoid circular import
+        User.objects.refresh_branches([user_id])
+        return result
+    
+    @classmethod
+    def sync_rosters(cls, rosters, dry_run=False):
+        """
+        Makes the enrollments of each course match an authoritative roster.
+        
+        rosters maps course_id to the complete list of enrolled user ids.
+        The difference against existing enrollments is computed in memory and
+        only the minimal inserts and deletes are applied, in one transaction.
+        With dry_run=True nothing is written. Returns a per-course report.
+        """
+        from django.db import transaction
+        from .user import User  # Import here to avoid circular import
+        
+        rosters = {str(course_id): {str(user_id) for user_id in user_ids}
+                   for course_id, user_ids in rosters.items()}
+        all_user_ids = set().union(*rosters.values()) if rosters else set()
+        
+        with transaction.atomic():
+            course_ids = set(Course.objects.filter(course_id__in=rosters).values_list('course_id', flat=True))
+            known_users = set(User.objects.filter(id_no__in=all_user_ids).values_list('id_no', flat=True))
+            
+            current = {course_id: {} for course_id in course_ids}
+            for pk, course_id, user_id in cls.objects.filter(course_id__in=course_ids).values_list(
+                    'id', 'course_id', 'user_id'):
+                current[course_id][user_id] = pk
+            
+            report = {'courses': {}, 'unknown_courses': sorted(set(rosters) - course_ids)}
+            to_create = []
+            to_delete = []
+            for course_id in sorted(course_ids):
+                desired = rosters[course_id] & known_users
+                enrolled = current[course_id]
+                added = sorted(desired - enrolled.keys())
+                dropped = sorted(enrolled.keys() - desired)
+                
+                to_create.extend(cls(course_id=course_id, user_id=user_id) for user_id in added)
+                to_delete.extend(enrolled[user_id] for user_id in dropped)
+                report['courses'][course_id] = {
+                    'added': added,
+                    'dropped': dropped,
+                    'unchanged': len(enrolled) - len(dropped),
+                    'unknown_users': sorted(rosters[course_id] - known_users),
+                }
+            
+            if not dry_run:
+                cls.objects.filter(id__in=to_delete).delete()
+                cls.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+                # Bulk operations bypass save/delete, so refresh branches explicitly
+                changed_users = {e.user_id for e in to_create}
+                for course_report in report['courses'].values():
+                    changed_users.update(course_report['dropped'])
+                User.objects.refresh_branches(changed_users)
+        
+        report['dry_run'] = dry_run
+        return report
\ No newline at end of file
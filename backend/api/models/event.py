@@ -1,6 +1,13 @@
-from django.db import models
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Coalesce, Least
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from .feed import FeedEntry
+from .user import User
 
 
 def validate_future_date(value):
@@ -11,6 +18,17 @@ def validate_future_date(value):
         raise ValidationError('Event date & time must be in the future')
 
 
+class EventQuerySet(models.QuerySet):
+    def with_participant_counts(self):
+        """
+        Annotates registered and waitlisted counts in the same query
+        """
+        return self.annotate(
+            num_participants=Count('participants', filter=Q(participants__status='registered')),
+            num_waitlisted=Count('participants', filter=Q(participants__status='waitlisted')),
+        )
+
+
 class Event(models.Model):
     """
     Event model representing club events and activities
@@ -21,6 +39,11 @@ class Event(models.Model):
     location = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maximum number of registered participants; further registrations are
+    # waitlisted. Null means unlimited
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    
+    objects = EventQuerySet.as_manager()
     
     class Meta:
         # Events are uniquely identified by the combination of club and date_time
@@ -37,21 +60,281 @@ class Event(models.Model):
             raise ValidationError({'date_time': 'Event date & time must be in the future'})
     
     def save(self, *args, **kwargs):
+        """
+        Override save to rebuild the seat counters when the capacity changes
+        and refresh the feeds when the club or time changes
+        """
         self.clean()
+        previous = None
+        if not self._state.adding:
+            previous = Event.objects.filter(pk=self.pk).values('capacity', 'club_id', 'date_time').first()
         super().save(*args, **kwargs)
+        if self.capacity != (previous['capacity'] if previous else None):
+            self.sync_seat_counters()
+        if previous is None or (previous['club_id'], previous['date_time']) != (self.club_id, self.date_time):
+            FeedEntry.event_changed(self.pk)
+    
+    def sync_seat_counters(self):
+        """
+        Splits the capacity across EVENT_SEAT_COUNTER_SHARDS seat counters,
+        counting the participants already registered, then fills any free
+        seats from the waitlist. Without a capacity the counters are dropped
+        and everyone waitlisted is registered. Also used to repair drift
+        """
+        with transaction.atomic():
+            # Lock the counters so no seat is claimed while they are rebuilt
+            list(EventSeatCounter.objects.select_for_update().filter(event=self))
+            EventSeatCounter.objects.filter(event=self).delete()
+            if self.capacity is None:
+                self.participants.filter(status='waitlisted').update(status='registered')
+                return
+            
+            registered = self.participants.filter(status='registered').count()
+            shards = settings.EVENT_SEAT_COUNTER_SHARDS
+            counters = []
+            for shard in range(shards):
+                capacity = self.capacity // shards + (1 if shard < self.capacity % shards else 0)
+                taken = min(capacity, registered)
+                registered -= taken
+                counters.append(EventSeatCounter(event=self, shard=shard, capacity=capacity, taken=taken))
+            # After a capacity cut the extra participants stay registered;
+            # the overbooked shard frees no seat until they leave
+            counters[-1].taken += registered
+            EventSeatCounter.objects.bulk_create(counters)
+        
+        EventParticipation.promote_waitlist(self.id)
+
+
+class EventSeatCounter(models.Model):
+    """
+    One shard of an event's seat counter. The capacity is split across
+    several counters so concurrent registrations claim seats on different
+    rows instead of queuing on one hot row
+    """
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='seat_counters')
+    shard = models.PositiveSmallIntegerField()
+    capacity = models.PositiveIntegerField()
+    taken = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('event', 'shard')
+    
+    def __str__(self):
+        return f"{self.event_id}/{self.shard}: {self.taken}/{self.capacity}"
+    
+    @classmethod
+    def claim_seat(cls, event_id):
+        """
+        Takes a seat with a conditional increment on a counter that has room,
+        trying them in random order. Returns False if the event is full.
+        Full events cost one plain SELECT and take no locks
+        """
+        shards = list(cls.objects.filter(
+            event_id=event_id, taken__lt=F('capacity')
+        ).values_list('shard', flat=True))
+        random.shuffle(shards)
+        for shard in shards:
+            if cls.objects.filter(
+                event_id=event_id, shard=shard, taken__lt=F('capacity')
+            ).update(taken=F('taken') + 1):
+                return True
+        return False
+    
+    @classmethod
+    def release_seat(cls, event_id):
+        """
+        Gives a seat back, from the fullest counter first so an overbooked
+        counter is drained before any other one frees a seat
+        """
+        shards = cls.objects.filter(event_id=event_id, taken__gt=0).order_by(
+            '-taken'
+        ).values_list('shard', flat=True)
+        for shard in shards:
+            if cls.objects.filter(event_id=event_id, shard=shard, taken__gt=0).update(
+                taken=F('taken') - 1
+            ):
+                return
 
 
 class EventParticipation(models.Model):
     """
-    Represents users participating in events
+    Represents users participating in events. When an event is full new
+    participants are waitlisted and promoted first-come first-served
     """
+    STATUS_CHOICES = (
+        ('registered', 'Registered'),
+        ('waitlisted', 'Waitlisted'),
+    )
+    
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='participations')
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='participants')
     registered_at = models.DateTimeField(auto_now_add=True)
     attended = models.BooleanField(default=False)
+    attended_at = models.DateTimeField(null=True, blank=True)  # First check-in at the door
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='registered')
+    
+    # Participants classified and updated per query by check_in
+    CHECK_IN_CHUNK_SIZE = 500
     
     class Meta:
         unique_together = ('user', 'event')  # A user can register for an event only once
+        indexes = [
+            # Participant pages in registration order
+            models.Index(fields=['event', 'registered_at'], name='participation_event_reg_idx'),
+            # Head of an event's waitlist
+            models.Index(fields=['event', 'status', 'registered_at'], name='participation_waitlist_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.name} - {self.event.name}"
\ No newline at end of file
+        return f"{self.user.name} - {self.event.name}"
+    
+    def save(self, *args, **kwargs):
+        """
+        Override save to stamp the check-in time when attendance is marked
+        and add the event to the feeds of the participant and their friends
+        """
+        if not self.attended:
+            self.attended_at = None
+        elif self.attended_at is None:
+            self.attended_at = timezone.now()
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            FeedEntry.participation_changed(self.user_id, self.event_id)
+    
+    def delete(self, *args, **kwargs):
+        """
+        Override delete to give back the seat, promote from the waitlist and
+        refresh the feeds of the participant and their friends
+        """
+        with transaction.atomic():
+            # The row may have been promoted since it was loaded, so the
+            # status deciding whether a seat is given back is read under lock
+            current_status = EventParticipation.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('status', flat=True).first()
+            if current_status is not None:
+                self.status = current_status
+            result = super().delete(*args, **kwargs)
+            if current_status == 'registered':
+                EventSeatCounter.release_seat(self.event_id)
+            FeedEntry.participation_changed(self.user_id, self.event_id)
+        if current_status == 'registered':
+            EventParticipation.promote_waitlist(self.event_id)
+        return result
+    
+    @classmethod
+    def register(cls, event, user_id):
+        """
+        Registers the user for event, or waitlists them if it is full.
+        
+        The seat is claimed on one of the event's seat counters in its own
+        short statement, before the participation is inserted, so no lock
+        is held across the insert. While anyone is waitlisted no seat is
+        claimed: a freed seat goes to the head of the waitlist, not to a
+        newcomer. If the insert fails (the user registered concurrently)
+        the seat is given back and IntegrityError is raised
+        """
+        if event.capacity is None:
+            with transaction.atomic():
+                return cls.objects.create(event=event, user_id=user_id)
+        
+        seated = (
+            not cls.objects.filter(event_id=event.id, status='waitlisted').exists()
+            and EventSeatCounter.claim_seat(event.id)
+        )
+        try:
+            with transaction.atomic():
+                participation = cls.objects.create(
+                    event=event, user_id=user_id, status='registered' if seated else 'waitlisted'
+                )
+        except IntegrityError:
+            if seated:
+                EventSeatCounter.release_seat(event.id)
+                cls.promote_waitlist(event.id)
+            raise
+        
+        if not seated:
+            # A seat may have been freed while this registration was waitlisted
+            cls.promote_waitlist(event.id)
+            participation.refresh_from_db(fields=['status'])
+        return participation
+    
+    @classmethod
+    def promote_waitlist(cls, event_id):
+        """
+        Moves waitlisted participants into free seats in registration order.
+        Returns the number promoted.
+        
+        A seat is claimed first and then the head of the waitlist is locked,
+        waiting for any concurrent promotion of the same row, so the seat
+        always goes to the oldest waitlisted participant. If nobody is
+        waitlisted the transaction rolls the claim back
+        """
+        promoted = 0
+        while True:
+            with transaction.atomic():
+                if not EventSeatCounter.claim_seat(event_id):
+                    return promoted
+                head = cls.objects.select_for_update().filter(
+                    event_id=event_id, status='waitlisted'
+                ).order_by('registered_at', 'id').first()
+                if head is None:
+                    transaction.set_rollback(True)
+                    return promoted
+                cls.objects.filter(pk=head.pk).update(status='registered')
+            promoted += 1
+    
+    @classmethod
+    def check_in(cls, event_id, check_ins):
+        """
+        Marks registered participants of an event as attended, given
+        {user_id: check-in time}, e.g. a batch from a door scanner.
+        
+        Idempotent: a participant keeps the earliest check-in time seen, so
+        batches can be resubmitted or arrive out of order. Each chunk of ids
+        costs one SELECT to classify them and one UPDATE for all of them.
+        Returns the ids grouped by outcome
+        """
+        report = {'checked_in': [], 'already_checked_in': [], 'waitlisted': [],
+                  'not_registered': [], 'unknown_users': []}
+        user_ids = list(check_ins)
+        for start in range(0, len(user_ids), cls.CHECK_IN_CHUNK_SIZE):
+            chunk = user_ids[start:start + cls.CHECK_IN_CHUNK_SIZE]
+            rows = {
+                user_id: (participation_status, attended, attended_at)
+                for user_id, participation_status, attended, attended_at in cls.objects.filter(
+                    event_id=event_id, user_id__in=chunk
+                ).values_list('user_id', 'status', 'attended', 'attended_at')
+            }
+            
+            updates = []
+            for user_id in chunk:
+                if user_id not in rows:
+                    report['not_registered'].append(user_id)
+                    continue
+                participation_status, attended, attended_at = rows[user_id]
+                if participation_status != 'registered':
+                    report['waitlisted'].append(user_id)
+                    continue
+                report['already_checked_in' if attended else 'checked_in'].append(user_id)
+                if attended_at is None or check_ins[user_id] < attended_at:
+                    updates.append(user_id)
+            
+            if updates:
+                time = Case(
+                    *[When(user_id=user_id, then=Value(check_ins[user_id])) for user_id in updates],
+                    output_field=models.DateTimeField()
+                )
+                # Least keeps an earlier check-in written concurrently
+                cls.objects.filter(event_id=event_id, user_id__in=updates, status='registered').update(
+                    attended=True, attended_at=Least(Coalesce(F('attended_at'), time), time)
+                )
+        
+        if report['not_registered']:
+            known = set(User.objects.filter(
+                id_no__in=report['not_registered']
+            ).values_list('id_no', flat=True))
+            report['unknown_users'] = [user_id for user_id in report['not_registered'] if user_id not in known]
+            report['not_registered'] = [user_id for user_id in report['not_registered'] if user_id in known]
+        return report
@@ -0,0 +1,210 @@
+from django.db import connections, models, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+
+class FeedEntry(models.Model):
+    """
+    An event in a user's precomputed upcoming-events feed, with the reasons
+    it is relevant to them. Entries are refreshed incrementally when the
+    memberships, friendships, participations or events behind them change
+    """
+    # Ranking: registered events first, then the user's clubs, and each
+    # friend going adds a point up to MAX_FRIENDS_SCORE
+    REGISTERED_SCORE = 4
+    CLUB_SCORE = 2
+    MAX_FRIENDS_SCORE = 3
+    # Users whose entries are recomputed per round of queries
+    REFRESH_CHUNK_SIZE = 500
+    
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='feed_entries')
+    event = models.ForeignKey('Event', on_delete=models.CASCADE, related_name='feed_entries')
+    event_time = models.DateTimeField()  # Copy of event.date_time, so upcoming entries are found by index
+    registered = models.BooleanField(default=False)
+    from_club = models.BooleanField(default=False)
+    friends_going = models.PositiveIntegerField(default=0)
+    score = models.PositiveSmallIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('user', 'event')
+        verbose_name_plural = "Feed entries"
+        indexes = [
+            # A user's upcoming entries are a range scan on this index
+            models.Index(fields=['user', 'event_time'], name='feedentry_user_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_id} in the feed of {self.user_id} ({self.score})"
+    
+    @classmethod
+    def score_for(cls, registered, from_club, friends_going):
+        return ((cls.REGISTERED_SCORE if registered else 0) + (cls.CLUB_SCORE if from_club else 0)
+                + min(friends_going, cls.MAX_FRIENDS_SCORE))
+    
+    @classmethod
+    def refresh(cls, user_ids, event_ids):
+        """
+        Recomputes the entries of the given users for the given upcoming
+        events, creating, updating or deleting them as needed. Costs a fixed
+        number of queries per REFRESH_CHUNK_SIZE users
+        """
+        from .event import Event  # Import here to avoid circular import
+        
+        events = {
+            event_id: (club_id, date_time)
+            for event_id, club_id, date_time in Event.objects.filter(
+                id__in=list(event_ids), date_time__gte=timezone.now()
+            ).values_list('id', 'club_id', 'date_time')
+        }
+        if not events:
+            return
+        user_ids = list(dict.fromkeys(user_ids))
+        for start in range(0, len(user_ids), cls.REFRESH_CHUNK_SIZE):
+            cls._refresh_chunk(user_ids[start:start + cls.REFRESH_CHUNK_SIZE], events)
+    
+    @classmethod
+    def _refresh_chunk(cls, user_ids, events):
+        from .club import ClubMembership
+        from .event import EventParticipation
+        from .friend import Friend
+        
+        events_by_club = {}
+        for event_id, (club_id, _) in events.items():
+            events_by_club.setdefault(club_id, []).append(event_id)
+        
+        from_club = {
+            (user_id, event_id)
+            for user_id, club_id in ClubMembership.objects.filter(
+                user_id__in=user_ids, club_id__in=events_by_club
+            ).values_list('user_id', 'club_id')
+            for event_id in events_by_club[club_id]
+        }
+        registered = set(EventParticipation.objects.filter(
+            user_id__in=user_ids, event_id__in=events
+        ).values_list('user_id', 'event_id'))
+        friends_going = {
+            (user_id, event_id): going
+            for user_id, event_id, going in Friend.objects.filter(
+                user_id__in=user_ids, friend__participations__event_id__in=events
+            ).order_by().values('user_id', 'friend__participations__event_id').annotate(
+                going=Count('id')
+            ).values_list('user_id', 'friend__participations__event_id', 'going')
+        }
+        existing = {
+            (entry.user_id, entry.event_id): entry
+            for entry in cls.objects.filter(user_id__in=user_ids, event_id__in=events)
+        }
+        # Entries of past events are never shown again; drop them on the way
+        cls.objects.filter(user_id__in=user_ids, event_time__lt=timezone.now()).delete()
+        
+        created, updated = [], []
+        for key in from_club | registered | friends_going.keys():
+            user_id, event_id = key
+            values = {
+                'event_time': events[event_id][1],
+                'registered': key in registered,
+                'from_club': key in from_club,
+                'friends_going': friends_going.get(key, 0),
+            }
+            values['score'] = cls.score_for(values['registered'], values['from_club'], values['friends_going'])
+            entry = existing.pop(key, None)
+            if entry is None:
+                created.append(cls(user_id=user_id, event_id=event_id, **values))
+            elif any(getattr(entry, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(entry, field, value)
+                updated.append(entry)
+        
+        fields = ['event_time', 'registered', 'from_club', 'friends_going', 'score']
+        # If a concurrent refresh inserted the same entry, this newer result
+        # overwrites it. MySQL upserts on any unique key and takes no target
+        features = connections[cls.objects.db].features
+        cls.objects.bulk_create(
+            created, batch_size=1000, update_conflicts=True, update_fields=fields,
+            unique_fields=['user', 'event'] if features.supports_update_conflicts_with_target else None
+        )
+        cls.objects.bulk_update(updated, fields, batch_size=1000)
+        # Whatever is left no longer has a reason to be in the feed
+        if existing:
+            cls.objects.filter(pk__in=[entry.pk for entry in existing.values()]).delete()
+    
+    @classmethod
+    def prune_past(cls):
+        """
+        Deletes the entries of past events of every user, including users
+        whose feeds have not been refreshed since. Returns the number deleted
+        """
+        return cls.objects.filter(event_time__lt=timezone.now()).delete()[0]
+    
+    @classmethod
+    def rebuild(cls, user_id):
+        """
+        Recomputes a user's whole feed and drops entries of past events
+        """
+        from .club import ClubMembership
+        from .event import Event, EventParticipation
+        from .friend import Friend
+        
+        event_ids = list(Event.objects.filter(date_time__gte=timezone.now()).filter(
+            models.Q(club_id__in=ClubMembership.objects.filter(user_id=user_id).values('club_id'))
+            | models.Q(id__in=EventParticipation.objects.filter(user_id=user_id).values('event_id'))
+            | models.Q(id__in=EventParticipation.objects.filter(
+                user_id__in=Friend.objects.filter(user_id=user_id).values('friend_id')
+            ).values('event_id'))
+        ).values_list('id', flat=True))
+        cls.objects.filter(user_id=user_id).exclude(event_id__in=event_ids).delete()
+        cls.refresh([user_id], event_ids)
+    
+    # The hooks below are called by the models feeding the feed. They run
+    # once the current transaction commits, so the source rows are visible
+    # and a rolled back change leaves the feed alone
+    
+    @classmethod
+    def membership_changed(cls, user_id, club_id):
+        """
+        Refreshes the feed of user_id for the club's upcoming events
+        """
+        def refresh():
+            from .event import Event
+            cls.refresh([user_id], Event.objects.filter(
+                club_id=club_id, date_time__gte=timezone.now()
+            ).values_list('id', flat=True))
+        transaction.on_commit(refresh)
+    
+    @classmethod
+    def friendship_changed(cls, user_id, friend_id):
+        """
+        Refreshes the feed of user_id for the events friend_id registered for
+        """
+        def refresh():
+            from .event import EventParticipation
+            cls.refresh([user_id], EventParticipation.objects.filter(
+                user_id=friend_id, event__date_time__gte=timezone.now()
+            ).values_list('event_id', flat=True))
+        transaction.on_commit(refresh)
+    
+    @classmethod
+    def participation_changed(cls, user_id, event_id):
+        """
+        Refreshes the entry of the participant and of everyone who has them as a friend
+        """
+        def refresh():
+            from .friend import Friend
+            user_ids = [user_id, *Friend.objects.filter(friend_id=user_id).values_list('user_id', flat=True)]
+            cls.refresh(user_ids, [event_id])
+        transaction.on_commit(refresh)
+    
+    @classmethod
+    def event_changed(cls, event_id):
+        """
+        Refreshes the entries of the event's club members and of everyone
+        already having it in their feed
+        """
+        def refresh():
+            from .club import ClubMembership
+            user_ids = [
+                *cls.objects.filter(event_id=event_id).values_list('user_id', flat=True),
+                *ClubMembership.objects.filter(club__events=event_id).values_list('user_id', flat=True),
+            ]
+            cls.refresh(user_ids, [event_id])
+        transaction.on_commit(refresh)
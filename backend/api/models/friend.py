@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.exceptions import ValidationError
+from .feed import FeedEntry
 
 
 class Friend(models.Model):
@@ -25,7 +26,18 @@ class Friend(models.Model):
     
     def save(self, *args, **kwargs):
         self.clean()
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if adding:
+            FeedEntry.friendship_changed(self.user_id, self.friend_id)
+    
+    def delete(self, *args, **kwargs):
+        """
+        Override delete to drop the friend's events from the user's feed
+        """
+        result = super().delete(*args, **kwargs)
+        FeedEntry.friendship_changed(self.user_id, self.friend_id)
+        return result
 
 
 class FriendRequest(models.Model):
@@ -1,4 +1,29 @@
+from django.core.cache import cache
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+
+DASHBOARD_VERSION_KEY = 'hostel_dashboard_version'
+
+
+def get_dashboard_version():
+    """
+    Returns the current version of the cached occupancy dashboards
+    """
+    return cache.get_or_set(DASHBOARD_VERSION_KEY, 1, None)
+
+
+def invalidate_occupancy_dashboard():
+    """
+    Bumps the dashboard cache version so every cached occupancy summary is
+    recomputed on next access. Must be called after any occupancy change,
+    including bulk updates that bypass Occupancy.save
+    """
+    try:
+        cache.incr(DASHBOARD_VERSION_KEY)
+    except ValueError:
+        cache.set(DASHBOARD_VERSION_KEY, 1, None)
 
 
 class Hostel(models.Model):
@@ -12,6 +37,22 @@ class Hostel(models.Model):
     
     def __str__(self):
         return self.hostel_name
+    
+    def save(self, *args, **kwargs):
+        """
+        Override save to invalidate the cached occupancy dashboards
+        """
+        super().save(*args, **kwargs)
+        invalidate_occupancy_dashboard()
+    
+    def delete(self, *args, **kwargs):
+        """
+        Override delete to invalidate the cached occupancy dashboards, which
+        also covers the rooms and stays removed by the cascade
+        """
+        result = super().delete(*args, **kwargs)
+        invalidate_occupancy_dashboard()
+        return result
 
 
 class Room(models.Model):
@@ -20,26 +61,296 @@ class Room(models.Model):
     """
     hostel = models.ForeignKey(Hostel, on_delete=models.CASCADE, related_name='rooms')
     room_number = models.CharField(max_length=20)
+    floor = models.SmallIntegerField(null=True, blank=True)  # Set for rooms created from a layout
+    capacity = models.PositiveSmallIntegerField(default=1)  # Number of beds
+    # Counter of active occupancies, maintained by Occupancy and the bulk
+    # hostel operations so vacancy lookups never count occupants
+    occupied_beds = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         unique_together = ('hostel', 'room_number')  # Room numbers must be unique within a hostel
+        indexes = [
+            # Vacancy lookups scan one hostel's rooms using only this index
+            models.Index(fields=['hostel', 'occupied_beds', 'capacity'], name='room_vacancy_idx'),
+        ]
     
     def __str__(self):
         return f"{self.hostel.hostel_name} - Room {self.room_number}"
+    
+    def save(self, *args, **kwargs):
+        """
+        Override save to invalidate the cached occupancy dashboards
+        """
+        super().save(*args, **kwargs)
+        invalidate_occupancy_dashboard()
+    
+    def delete(self, *args, **kwargs):
+        """
+        Override delete to invalidate the cached occupancy dashboards
+        """
+        result = super().delete(*args, **kwargs)
+        invalidate_occupancy_dashboard()
+        return result
+    
+    @property
+    def free_beds(self):
+        return max(0, self.capacity - self.occupied_beds)
+    
+    @classmethod
+    def adjust_occupied_beds(cls, deltas):
+        """
+        Applies {room_id: change in active occupancies} to the occupied beds
+        counters. Decrements stop at 0, so a counter that was never backfilled
+        cannot underflow the unsigned column
+        """
+        for room_id, delta in deltas.items():
+            if delta > 0:
+                cls.objects.filter(id=room_id).update(occupied_beds=F('occupied_beds') + delta)
+            elif delta < 0:
+                # GREATEST first, so no intermediate value is negative
+                cls.objects.filter(id=room_id).update(
+                    occupied_beds=Greatest(F('occupied_beds'), Value(-delta)) + delta
+                )
+
+
+class OccupancyQuerySet(models.QuerySet):
+    """
+    Date-range lookups over the occupancy history. A stay covers the days
+    from from_date up to but excluding to_date (the move-out date), so a
+    student moving rooms on day D is only counted in the new room on D
+    """
+    def current(self):
+        return self.filter(to_date__isnull=True)
+    
+    def on_date(self, day):
+        return self.filter(from_date__lte=day).filter(
+            models.Q(to_date__isnull=True) | models.Q(to_date__gt=day)
+        )
+    
+    def overlapping(self, start, end):
+        """
+        Stays that cover any day in [start, end)
+        """
+        return self.filter(from_date__lt=end).filter(
+            models.Q(to_date__isnull=True) | models.Q(to_date__gt=start)
+        )
 
 
 class Occupancy(models.Model):
     """
-    Represents the relationship between a user and their hostel room
+    A stay of a user in a hostel room. Stays are closed by setting to_date
+    and kept as the room and student history
     """
-    occupant = models.OneToOneField('User', on_delete=models.CASCADE, primary_key=True, 
-                                  related_name='hostel_room')
+    occupant = models.ForeignKey('User', on_delete=models.CASCADE, related_name='occupancies')
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='occupants')
     from_date = models.DateField()
     to_date = models.DateField(null=True, blank=True)  # Null if currently occupied
+    # Mirrors occupant while the stay is open and is cleared when it closes.
+    # Being unique it allows one open stay per user, and user.hostel_room is
+    # the primary key lookup of the current occupancy
+    current_occupant = models.OneToOneField('User', on_delete=models.CASCADE, null=True, blank=True,
+                                            editable=False, related_name='hostel_room')
+    
+    objects = OccupancyQuerySet.as_manager()
     
     class Meta:
         verbose_name_plural = "Occupancies"
+        indexes = [
+            # "Who was in room X on date D" is a range scan on this index
+            models.Index(fields=['room', 'from_date', 'to_date'], name='occupancy_room_dates_idx'),
+            # "Room history of student S"
+            models.Index(fields=['occupant', 'from_date'], name='occupancy_occupant_dates_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.occupant.name} in {self.room}"
\ No newline at end of file
+        return f"{self.occupant.name} in {self.room}"
+    
+    def save(self, *args, **kwargs):
+        """
+        Override save to keep the current occupant pointer and the rooms'
+        occupied beds counters in sync and invalidate the cached occupancy
+        dashboards
+        """
+        self.current_occupant_id = self.occupant_id if self.to_date is None else None
+        previous = None
+        if self.pk is not None:
+            previous = Occupancy.objects.filter(pk=self.pk).values('room_id', 'to_date').first()
+        super().save(*args, **kwargs)
+        
+        deltas = {}
+        if previous and previous['to_date'] is None:
+            deltas[previous['room_id']] = -1
+        if self.to_date is None:
+            deltas[self.room_id] = deltas.get(self.room_id, 0) + 1
+        Room.adjust_occupied_beds(deltas)
+        invalidate_occupancy_dashboard()
+    
+    def delete(self, *args, **kwargs):
+        """
+        Override delete to keep the room's occupied beds counter in sync
+        and invalidate the cached occupancy dashboards
+        """
+        was_active = self.to_date is None
+        room_id = self.room_id
+        result = super().delete(*args, **kwargs)
+        if was_active:
+            Room.adjust_occupied_beds({room_id: -1})
+        invalidate_occupancy_dashboard()
+        return result
+    
+    @classmethod
+    def move(cls, moves, day):
+        """
+        Moves users into rooms as of day, given {user_id: room_id}: their
+        open stays are closed with to_date=day and new stays are inserted,
+        one UPDATE and one batched INSERT in total. Users already living in
+        their target room are left alone. Returns {room_id: change in
+        occupied beds}; callers adjust the counters and invalidate the
+        dashboards, which are bypassed by the bulk writes
+        """
+        open_stays = dict(cls.objects.current().filter(
+            occupant_id__in=moves
+        ).values_list('occupant_id', 'room_id'))
+        moves = {user_id: room_id for user_id, room_id in moves.items()
+                 if open_stays.get(user_id) != room_id}
+        
+        deltas = {}
+        for user_id, room_id in moves.items():
+            if user_id in open_stays:
+                deltas[open_stays[user_id]] = deltas.get(open_stays[user_id], 0) - 1
+            deltas[room_id] = deltas.get(room_id, 0) + 1
+        
+        cls.objects.current().filter(occupant_id__in=moves.keys() & open_stays.keys()).update(
+            to_date=day, current_occupant=None
+        )
+        cls.objects.bulk_create(
+            [cls(occupant_id=user_id, current_occupant_id=user_id, room_id=room_id, from_date=day)
+             for user_id, room_id in moves.items()],
+            batch_size=1000
+        )
+        return deltas
+    
+    @classmethod
+    def checkout(cls, rooms, day):
+        """
+        Closes every open stay in the given rooms queryset as of day, e.g. at
+        term end. The stays stay on as history. Runs one UPDATE for the rooms'
+        counters and one for the stays, in a transaction. Returns counts
+        """
+        from django.db import transaction
+        
+        with transaction.atomic():
+            # The ids are read first: MySQL rejects an UPDATE of api_room
+            # filtered by a subquery on api_room (error 1093)
+            room_ids = list(rooms.values_list('id', flat=True))
+            # Resetting the counters first locks the rooms, so assignments
+            # into them wait until the checkout has committed
+            Room.objects.filter(id__in=room_ids).update(occupied_beds=0)
+            stays = cls.objects.current().filter(room_id__in=room_ids)
+            rooms_vacated = stays.values('room_id').distinct().count()
+            # A stay that started after day is closed on the day it started
+            closed = stays.update(
+                to_date=Greatest(F('from_date'), models.Value(day)), current_occupant=None
+            )
+        
+        invalidate_occupancy_dashboard()
+        return {'closed': closed, 'rooms_vacated': rooms_vacated, 'to_date': day}
+    
+    @classmethod
+    def allocate(cls, user_ids, hostel_ids=None, keep_friends=True, group_by_year=True, dry_run=False):
+        """
+        Allocates students to vacant beds in one pass, for semester intake.
+        
+        Students that already live in a room are skipped. The vacant rooms
+        (optionally limited to hostel_ids) and the friendships among the
+        students are loaded with one query each, the assignment is planned
+        in memory (see api.allocation) and written with a single batched
+        insert. With dry_run=True the plan is returned without writing.
+        """
+        from collections import Counter
+        from datetime import date
+        from django.db import transaction
+        from ..allocation import allocate_rooms
+        from .friend import Friend  # Import here to avoid circular import
+        from .user import User
+        
+        user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+        
+        with transaction.atomic():
+            known = set(User.objects.filter(id_no__in=user_ids).values_list('id_no', flat=True))
+            # Lock the students' open stays so they cannot be moved concurrently;
+            # concurrent inserts are rejected by the unique current_occupant
+            housed = set(cls.objects.current().select_for_update().filter(
+                occupant_id__in=known
+            ).values_list('occupant_id', flat=True))
+            students = [user_id for user_id in user_ids if user_id in known and user_id not in housed]
+            
+            rooms = Room.objects.select_for_update().filter(occupied_beds__lt=F('capacity'))
+            if hostel_ids is not None:
+                rooms = rooms.filter(hostel_id__in=hostel_ids)
+            rooms = {
+                room_id: (hostel_id, room_number, occupied_beds, capacity)
+                for room_id, hostel_id, room_number, occupied_beds, capacity in rooms.order_by(
+                    'hostel_id', 'room_number'
+                ).values_list('id', 'hostel_id', 'room_number', 'occupied_beds', 'capacity')
+            }
+            
+            friendships = []
+            if keep_friends and students:
+                # Friendships are stored in both directions; load each pair once
+                friendships = list(Friend.objects.filter(
+                    user_id__in=students, friend_id__in=students, user_id__lt=F('friend_id')
+                ).values_list('user_id', 'friend_id'))
+            
+            assignments, unplaced = allocate_rooms(
+                students,
+                [(room_id, capacity - occupied_beds)
+                 for room_id, (_, _, occupied_beds, capacity) in rooms.items()],
+                friendships,
+                year_of=User.year_from_id if group_by_year else None,
+            )
+            
+            if not dry_run and assignments:
+                today = date.today()
+                cls.objects.bulk_create(
+                    [cls(occupant_id=user_id, current_occupant_id=user_id, room_id=room_id, from_date=today)
+                     for user_id, room_id in assignments.items()],
+                    batch_size=1000
+                )
+                # The rooms are locked, so their counters can be written directly
+                Room.objects.bulk_update(
+                    [Room(id=room_id, occupied_beds=rooms[room_id][2] + placed)
+                     for room_id, placed in Counter(assignments.values()).items()],
+                    ['occupied_beds'],
+                    batch_size=1000
+                )
+        
+        if not dry_run and assignments:
+            # Bulk writes bypass save, so invalidate the dashboards explicitly
+            invalidate_occupancy_dashboard()
+        
+        together = sum(1 for user_id, friend_id in friendships
+                       if assignments.get(user_id) is not None
+                       and assignments.get(user_id) == assignments.get(friend_id))
+        return {
+            'dry_run': dry_run,
+            'requested': len(user_ids),
+            'assigned': len(assignments),
+            'rooms_used': len(set(assignments.values())),
+            'friendships': len(friendships),
+            'friendships_together': together,
+            'assignments': [
+                {
+                    'user_id': user_id,
+                    'hostel_id': rooms[room_id][0],
+                    'room_id': room_id,
+                    'room': rooms[room_id][1],
+                }
+                for user_id, room_id in sorted(
+                    assignments.items(), key=lambda item: (rooms[item[1]][:2], item[0])
+                )
+            ],
+            'unplaced': unplaced,
+            'already_housed': sorted(housed),
+            'unknown_users': [user_id for user_id in user_ids if user_id not in known],
+        }
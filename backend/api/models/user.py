@@ -40,6 +40,34 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault('user_type', 'maintainer')
         
         return self.create_user(id_no, email, name, password, **extra_fields)
+    
+    def refresh_branches(self, user_ids):
+        """
+        Recomputes the stored branch for the given users from their enrollments.
+        The branch is the department of the first course (by course_id) the user
+        is enrolled in, or None if the user is not enrolled anywhere.
+        Runs one SELECT plus one UPDATE per distinct branch.
+        """
+        from .course import Enrollment  # Import here to avoid circular import
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        
+        branches = dict.fromkeys(user_ids)
+        enrollments = (Enrollment.objects
+                       .filter(user_id__in=user_ids)
+                       .order_by('user_id', 'course_id')
+                       .values_list('user_id', 'course__department'))
+        for user_id, department in enrollments:
+            if branches[user_id] is None:
+                branches[user_id] = department
+        
+        # Group users by branch so each distinct value is a single UPDATE
+        by_branch = {}
+        for user_id, branch in branches.items():
+            by_branch.setdefault(branch, []).append(user_id)
+        for branch, ids in by_branch.items():
+            self.filter(id_no__in=ids).update(branch=branch)
 
 
 class User(AbstractBaseUser, PermissionsMixin):
@@ -59,7 +87,11 @@ class User(AbstractBaseUser, PermissionsMixin):
                             validators=[EmailValidator()])
     name = models.CharField(max_length=255)
     password = models.CharField(max_length=255)
-    # Branch and Year are derived attributes from Course, implemented as properties
+    # Branch is derived from course enrollment but stored so that serializing
+    # users never needs a query; it is kept in sync by Enrollment (see
+    # UserManager.refresh_branches). Year is derived from the ID number.
+    branch = models.CharField(max_length=100, null=True, blank=True, editable=False,
+                              db_index=True)
     
     # User type for permission levels
     user_type = models.CharField(max_length=20, choices=USER_TYPE_CHOICES, default='user')
@@ -80,29 +112,43 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return f"{self.name} ({self.id_no})"
     
-    @property
-    def branch(self):
+    def delete(self, *args, **kwargs):
         """
-        Derive branch from course enrollment if available
+        Override delete to check the user out of their room, cancel their
+        event registrations and leave their clubs first. The cascade would
+        bypass Occupancy.delete, EventParticipation.delete and
+        ClubMembership.delete, leaving the room's occupied beds counter, the
+        cached occupancy dashboards, the event seat counters and the club
+        member counters stale, and the waitlists stuck
         """
-        from .course import Course  # Import here to avoid circular import
-        enrollment = Course.objects.filter(students=self).first()
-        if enrollment:
-            # Assuming the branch can be derived from course_id according to your schema
-            # This implementation will depend on the exact format of course IDs
-            # For example, if course_id has format like "CS101", then branch would be "CS"
-            return enrollment.department
-        return None
-        
+        from .hostel import Occupancy  # Import here to avoid circular import
+        from .event import EventParticipation
+        from .club import ClubMembership
+        stay = Occupancy.objects.current().filter(occupant=self).first()
+        if stay is not None:
+            stay.delete()
+        for participation in EventParticipation.objects.filter(user=self):
+            participation.delete()
+        for membership in ClubMembership.objects.filter(user=self):
+            membership.delete()
+        return super().delete(*args, **kwargs)
+    
     @property
     def year(self):
         """
         Derive year from ID number if it follows a pattern like 2023A7PS0466G
         where 2023 indicates the student's joining year
         """
+        return self.year_from_id(self.id_no)
+    
+    @staticmethod
+    def year_from_id(id_no):
+        """
+        Year of study for an ID number, without loading the user
+        """
         # Example assumes ID like 2023A7PS0466G where first 4 digits are year
-        if len(self.id_no) >= 4 and self.id_no[:4].isdigit():
-            joining_year = int(self.id_no[:4])
+        if len(id_no) >= 4 and id_no[:4].isdigit():
+            joining_year = int(id_no[:4])
             # Calculate current year of study
             import datetime
             current_year = datetime.datetime.now().year
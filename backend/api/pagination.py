@@ -0,0 +1,114 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class MessageCursorPagination(BasePagination):
+    """
+    Cursor pagination for chat message history.
+
+    Pages are keyed on (date_time, id) so fetching a page is an index range
+    scan on Message(chat, date_time) regardless of how long the chat is.
+    Without parameters the latest page is returned; ``before`` walks back into
+    older history and ``after`` fetches messages newer than a cursor.
+    Results are always in chronological order.
+    """
+    before_query_param = 'before'
+    after_query_param = 'after'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = settings.CHAT_MESSAGE_PAGE_SIZE
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        if requested <= 0:
+            return page_size
+        return min(requested, settings.CHAT_MESSAGE_MAX_PAGE_SIZE)
+
+    def make_cursor(self, date_time, message_id):
+        raw = f"{date_time.isoformat()}|{message_id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def encode_cursor(self, message):
+        return self.make_cursor(message.date_time, message.id)
+
+    def decode_cursor(self, encoded):
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode()).decode()
+            date_str, message_id = raw.split('|', 1)
+            return datetime.fromisoformat(date_str), uuid.UUID(message_id)
+        except (ValueError, UnicodeDecodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+        self.after = after
+
+        if after is not None:
+            date_time, message_id = self.decode_cursor(after)
+            return self.paginate_after(queryset, date_time, message_id, page_size)
+
+        if before is not None:
+            date_time, message_id = self.decode_cursor(before)
+            queryset = queryset.filter(
+                Q(date_time__lt=date_time) | Q(date_time=date_time, id__lt=message_id)
+            )
+        page = list(queryset.order_by('-date_time', '-id')[:page_size + 1])
+        self.has_older = len(page) > page_size
+        self.has_newer = before is not None
+        self.page = list(reversed(page[:page_size]))
+        return self.page
+
+    def paginate_after(self, queryset, date_time, message_id, page_size):
+        """
+        Returns the first page of messages strictly newer than (date_time, message_id)
+        """
+        queryset = queryset.filter(
+            Q(date_time__gt=date_time) | Q(date_time=date_time, id__gt=message_id)
+        ).order_by('date_time', 'id')
+        page = list(queryset[:page_size + 1])
+        self.has_newer = len(page) > page_size
+        self.has_older = True  # The cursor itself marks older history
+        self.page = page[:page_size]
+        return self.page
+
+    def get_paginated_data(self, data):
+        return {
+            'before': self.encode_cursor(self.page[0]) if self.page and self.has_older else None,
+            'after': self.encode_cursor(self.page[-1]) if self.page else self.after,
+            'has_newer': self.has_newer,
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+class RosterPagination(PageNumberPagination):
+    """
+    Page number pagination for member and participant rosters
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class FeedPagination(PageNumberPagination):
+    """
+    Page number pagination for the upcoming-events feed
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
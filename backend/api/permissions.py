@@ -0,0 +1,17 @@
+from .models import ClubMembership
+
+
+def club_roles(request):
+    """
+    Returns {club_id: role} for the requesting user. The map is loaded once
+    per request (at most one query, none when cached) and shared by every
+    permission class and view handling the request
+    """
+    roles = getattr(request, '_club_roles', None)
+    if roles is None:
+        if request.user.is_authenticated:
+            roles = ClubMembership.roles_for_user(request.user.pk)
+        else:
+            roles = {}
+        request._club_roles = roles
+    return roles
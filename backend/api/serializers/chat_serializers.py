@@ -1,3 +1,6 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
 from rest_framework import serializers
 from ..models import Chat, Message, GroupChat
 from .user_serializers import UserSerializer
@@ -12,7 +15,7 @@ class MessageSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Message
-        fields = ['id', 'chat', 'sender', 'sender_id', 'content', 'date_time', 'is_read']
+        fields = ['id', 'chat', 'sender', 'sender_id', 'content', 'date_time']
         read_only_fields = ['date_time']
     
     def create(self, validated_data):
@@ -28,14 +31,31 @@ class MessageSerializer(serializers.ModelSerializer):
         if not chat.participants.filter(id_no=sender_id).exists():
             raise serializers.ValidationError("You are not a participant in this chat.")
         
-        # Create message
-        message = Message.objects.create(
-            sender_id=sender_id,
-            **validated_data
-        )
+        with transaction.atomic():
+            # Create message
+            message = Message.objects.create(
+                sender_id=sender_id,
+                **validated_data
+            )
+            
+            # Update the chat's last message snapshot and updated_at timestamp,
+            # unless a newer message has already been recorded concurrently
+            Chat.objects.filter(chat_id=chat_id).filter(
+                Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.date_time)
+            ).update(updated_at=timezone.now(), **Chat.last_message_fields(message))
         
-        # Update chat's updated_at timestamp
-        chat.save()  # This triggers the auto_now field update
+        return message
+    
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            # Lock the chat so no newer message is recorded while this one is edited
+            chat = Chat.objects.select_for_update().get(chat_id=instance.chat_id)
+            message = super().update(instance, validated_data)
+            
+            # Keep the chat's last message snapshot in step when the latest message is edited
+            latest_id = chat.messages.order_by('-date_time', '-id').values_list('id', flat=True).first()
+            if latest_id == message.id:
+                Chat.objects.filter(chat_id=chat.chat_id).update(**Chat.last_message_fields(message))
         
         return message
 
@@ -66,37 +86,45 @@ class ChatSerializer(serializers.ModelSerializer):
     participants = UserSerializer(many=True, read_only=True)
     is_group_chat = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Chat
-        fields = ['chat_id', 'participants', 'is_group_chat', 'last_message', 'created_at', 'updated_at']
+        fields = ['chat_id', 'participants', 'is_group_chat', 'last_message', 'unread_count',
+                  'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
     
     def get_is_group_chat(self, obj):
         return hasattr(obj, 'group_info')
     
     def get_last_message(self, obj):
-        last_message = obj.messages.order_by('-date_time').first()
-        if last_message:
+        if obj.last_message_at:
             return {
-                'content': last_message.content,
-                'sender': last_message.sender.name,
-                'date_time': last_message.date_time
+                'content': obj.last_message_preview,
+                'sender': obj.last_message_sender_name,
+                'date_time': obj.last_message_at
             }
         return None
+    
+    def get_unread_count(self, obj):
+        # Counts are computed for all chats at once by the view (see ChatReadState.unread_counts)
+        unread_counts = self.context.get('unread_counts')
+        if unread_counts is None:
+            return None
+        return unread_counts.get(obj.chat_id, 0)
 
 
 class ChatDetailSerializer(serializers.ModelSerializer):
     """
-    Detailed chat serializer with messages
+    Detailed chat serializer with participants and group info.
+    Message history is paged separately (see MessageCursorPagination)
     """
     participants = UserSerializer(many=True, read_only=True)
-    messages = MessageSerializer(many=True, read_only=True)
     group_info = GroupChatSerializer(read_only=True)
     
     class Meta:
         model = Chat
-        fields = ['chat_id', 'participants', 'messages', 'group_info', 'created_at', 'updated_at']
+        fields = ['chat_id', 'participants', 'group_info', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
 
@@ -134,14 +162,10 @@ class ChatCreateSerializer(serializers.ModelSerializer):
             
         # For non-group chats, check if a chat already exists between these users
         if not is_group_chat:
-            user1, user2 = participants
-            existing_chats = Chat.objects.filter(participants__id_no=user1).filter(participants__id_no=user2)
-            
-            # Only consider direct chats (not group chats)
-            direct_chats = [chat for chat in existing_chats if not hasattr(chat, 'group_info')]
-            
-            if direct_chats and len(direct_chats) > 0:
+            direct_key = Chat.make_direct_key(*participants)
+            if Chat.objects.filter(direct_key=direct_key).exists():
                 raise serializers.ValidationError("A chat already exists between these users.")
+            attrs['direct_key'] = direct_key
         
         attrs['participants'] = participants
         return attrs
@@ -151,21 +175,25 @@ class ChatCreateSerializer(serializers.ModelSerializer):
         is_group_chat = validated_data.pop('is_group_chat', False)
         group_name = validated_data.pop('group_name', None)
         
-        # Create the chat
-        chat = Chat.objects.create(**validated_data)
-        
-        # Add participants
         from ..models import User
-        for participant_id in participants:
-            user = User.objects.get(id_no=participant_id)
-            chat.participants.add(user)
-        
-        # If it's a group chat, create the GroupChat instance
-        if is_group_chat and group_name:
-            GroupChat.objects.create(
-                chat=chat,
-                name=group_name,
-                admin=self.context['request'].user
-            )
+        try:
+            with transaction.atomic():
+                # Create the chat; the unique direct_key rejects a concurrent duplicate DM
+                chat = Chat.objects.create(**validated_data)
+                
+                # Add participants
+                for participant_id in participants:
+                    user = User.objects.get(id_no=participant_id)
+                    chat.participants.add(user)
+                
+                # If it's a group chat, create the GroupChat instance
+                if is_group_chat and group_name:
+                    GroupChat.objects.create(
+                        chat=chat,
+                        name=group_name,
+                        admin=self.context['request'].user
+                    )
+        except IntegrityError:
+            raise serializers.ValidationError("A chat already exists between these users.")
         
         return chat
\ No newline at end of file
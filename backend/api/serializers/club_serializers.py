@@ -7,14 +7,11 @@ class ClubSerializer(serializers.ModelSerializer):
     """
     Basic club serializer
     """
-    members_count = serializers.SerializerMethodField()
+    role_counts = serializers.ReadOnlyField()
     
     class Meta:
         model = Club
-        fields = ['name', 'type', 'description', 'members_count']
-    
-    def get_members_count(self, obj):
-        return obj.members.count()
+        fields = ['name', 'type', 'description', 'members_count', 'role_counts']
 
 
 class ClubMembershipSerializer(serializers.ModelSerializer):
@@ -31,6 +28,14 @@ class ClubMembershipSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'user_id', 'club', 'club_name', 'role', 'joined_date']
         read_only_fields = ['joined_date']
     
+    def get_fields(self):
+        fields = super().get_fields()
+        # A membership cannot be moved to another user or club once created
+        if self.instance is not None:
+            fields.pop('user_id')
+            fields.pop('club_name')
+        return fields
+    
     def create(self, validated_data):
         user_id = validated_data.pop('user_id')
         club_name = validated_data.pop('club_name')
@@ -58,7 +63,7 @@ class ClubDetailSerializer(serializers.ModelSerializer):
         fields = ['name', 'type', 'description', 'memberships']
     
     def get_memberships(self, obj):
-        memberships = ClubMembership.objects.filter(club=obj)
+        memberships = ClubMembership.objects.filter(club=obj).select_related('user', 'club')
         return ClubMembershipSerializer(memberships, many=True).data
 
 
@@ -1,5 +1,6 @@
+from django.db import IntegrityError
 from rest_framework import serializers
-from ..models import Event, EventParticipation
+from ..models import Event, EventParticipation, FeedEntry
 from .club_serializers import ClubSerializer
 from .user_serializers import UserSerializer
 
@@ -10,15 +11,24 @@ class EventSerializer(serializers.ModelSerializer):
     """
     club_name = serializers.ReadOnlyField(source='club.name')
     participants_count = serializers.SerializerMethodField()
+    waitlist_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Event
         fields = ['id', 'name', 'club', 'club_name', 'date_time', 'location', 
-                  'description', 'participants_count', 'created_at']
+                  'description', 'capacity', 'participants_count', 'waitlist_count', 'created_at']
         read_only_fields = ['created_at']
     
     def get_participants_count(self, obj):
-        return obj.participants.count()
+        # Use the count annotated by the viewset when available
+        if hasattr(obj, 'num_participants'):
+            return obj.num_participants
+        return obj.participants.filter(status='registered').count()
+    
+    def get_waitlist_count(self, obj):
+        if hasattr(obj, 'num_waitlisted'):
+            return obj.num_waitlisted
+        return obj.participants.filter(status='waitlisted').count()
 
 
 class EventParticipationSerializer(serializers.ModelSerializer):
@@ -32,8 +42,8 @@ class EventParticipationSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = EventParticipation
-        fields = ['id', 'user', 'user_id', 'event', 'event_id', 'registered_at', 'attended']
-        read_only_fields = ['registered_at']
+        fields = ['id', 'user', 'user_id', 'event', 'event_id', 'registered_at', 'status', 'attended', 'attended_at']
+        read_only_fields = ['registered_at', 'status', 'attended_at']
     
     def create(self, validated_data):
         user_id = validated_data.pop('user_id')
@@ -43,30 +53,47 @@ class EventParticipationSerializer(serializers.ModelSerializer):
         if EventParticipation.objects.filter(user_id=user_id, event_id=event_id).exists():
             raise serializers.ValidationError("User is already registered for this event.")
         
-        participation = EventParticipation.objects.create(
-            user_id=user_id,
-            event_id=event_id,
-            **validated_data
-        )
+        try:
+            event = Event.objects.get(pk=event_id)
+        except Event.DoesNotExist:
+            raise serializers.ValidationError("Event not found.")
+        
+        # Take a seat, or a place on the waitlist if the event is full
+        try:
+            participation = EventParticipation.register(event, user_id)
+        except IntegrityError:
+            raise serializers.ValidationError("User is already registered for this event.")
+        if validated_data.get('attended'):
+            participation.attended = True
+            participation.save(update_fields=['attended', 'attended_at'])
         return participation
 
 
 class EventDetailSerializer(serializers.ModelSerializer):
     """
-    Detailed event serializer with club and participant information
+    Detailed event serializer with club information. Participants are
+    listed page by page by the events/{id}/participants/ endpoint
     """
     club = ClubSerializer(read_only=True)
-    participants = serializers.SerializerMethodField()
+    participants_count = serializers.SerializerMethodField()
+    waitlist_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Event
         fields = ['id', 'name', 'club', 'date_time', 'location', 'description', 
-                  'participants', 'created_at']
+                  'capacity', 'participants_count', 'waitlist_count', 'created_at']
         read_only_fields = ['created_at']
     
-    def get_participants(self, obj):
-        participations = EventParticipation.objects.filter(event=obj)
-        return EventParticipationSerializer(participations, many=True).data
+    def get_participants_count(self, obj):
+        # Use the count annotated by the viewset when available
+        if hasattr(obj, 'num_participants'):
+            return obj.num_participants
+        return obj.participants.filter(status='registered').count()
+    
+    def get_waitlist_count(self, obj):
+        if hasattr(obj, 'num_waitlisted'):
+            return obj.num_waitlisted
+        return obj.participants.filter(status='waitlisted').count()
 
 
 class UserEventsSerializer(serializers.ModelSerializer):
@@ -77,4 +104,15 @@ class UserEventsSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = EventParticipation
-        fields = ['id', 'event', 'registered_at', 'attended']
\ No newline at end of file
+        fields = ['id', 'event', 'registered_at', 'attended']
+
+
+class FeedEntrySerializer(serializers.ModelSerializer):
+    """
+    Serializer for an event in the user's feed, with why it is there
+    """
+    event = EventSerializer()
+    
+    class Meta:
+        model = FeedEntry
+        fields = ['event', 'score', 'registered', 'from_club', 'friends_going']
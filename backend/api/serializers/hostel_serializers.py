@@ -1,3 +1,7 @@
+import re
+import string
+
+from django.db.models import F
 from rest_framework import serializers
 from ..models import Hostel, Room, Occupancy
 from .user_serializers import UserSerializer
@@ -12,10 +16,20 @@ class RoomSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Room
-        fields = ['id', 'hostel', 'hostel_name', 'room_number', 'occupants_count']
+        fields = ['id', 'hostel', 'hostel_name', 'room_number', 'floor', 'capacity', 'occupied_beds',
+                  'occupants_count']
+        read_only_fields = ['occupied_beds']
     
     def get_occupants_count(self, obj):
-        return obj.occupants.count()
+        # Current occupants, from the counter maintained by Occupancy
+        return obj.occupied_beds
+    
+    def validate_capacity(self, value):
+        if self.instance is not None and value < self.instance.occupied_beds:
+            raise serializers.ValidationError(
+                f"Capacity cannot be lower than the {self.instance.occupied_beds} current occupants."
+            )
+        return value
 
 
 class HostelSerializer(serializers.ModelSerializer):
@@ -29,6 +43,9 @@ class HostelSerializer(serializers.ModelSerializer):
         fields = ['id', 'hostel_name', 'location', 'total_rooms', 'warden', 'rooms_count']
     
     def get_rooms_count(self, obj):
+        # Use the count annotated by the viewset when available
+        if hasattr(obj, 'num_rooms'):
+            return obj.num_rooms
         return obj.rooms.count()
 
 
@@ -54,7 +71,7 @@ class OccupancySerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Occupancy
-        fields = ['occupant', 'occupant_id', 'room', 'room_id', 'from_date', 'to_date']
+        fields = ['id', 'occupant', 'occupant_id', 'room', 'room_id', 'from_date', 'to_date']
     
     def create(self, validated_data):
         occupant_id = validated_data.pop('occupant_id')
@@ -64,6 +81,12 @@ class OccupancySerializer(serializers.ModelSerializer):
         if Occupancy.objects.filter(occupant_id=occupant_id, to_date__isnull=True).exists():
             raise serializers.ValidationError("User already has an active hostel room assignment.")
         
+        # Check if the room has a free bed
+        if validated_data.get('to_date') is None and not Room.objects.filter(
+            id=room_id, occupied_beds__lt=F('capacity')
+        ).exists():
+            raise serializers.ValidationError("This room has no free beds.")
+        
         occupancy = Occupancy.objects.create(
             occupant_id=occupant_id,
             room_id=room_id,
@@ -81,9 +104,84 @@ class RoomWithOccupantsSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Room
-        fields = ['id', 'hostel', 'hostel_name', 'room_number', 'occupants']
+        fields = ['id', 'hostel', 'hostel_name', 'room_number', 'floor', 'capacity', 'occupied_beds',
+                  'occupants']
     
     def get_occupants(self, obj):
         # Get active occupancies (to_date is null)
-        active_occupancies = obj.occupants.filter(to_date__isnull=True)
-        return OccupancySerializer(active_occupancies, many=True).data
\ No newline at end of file
+        active_occupancies = obj.occupants.current().select_related('occupant')
+        return OccupancySerializer(active_occupancies, many=True).data
+
+
+class RoomLayoutSerializer(serializers.Serializer):
+    """
+    Validates a room layout spec for bulk room creation and expands it
+    into room numbers, e.g. blocks A and B, 4 floors of 20 rooms each,
+    numbered with the pattern '{block}{floor}{room:02d}' (A101 ... B420)
+    """
+    MAX_ROOMS = 5000
+    PATTERN_FIELDS = ('block', 'floor', 'room')
+    # Optional zero padding and a width below 10, e.g. {room:02d}
+    PATTERN_FORMAT_SPEC = re.compile(r'0?\d?d?')
+    
+    blocks = serializers.ListField(child=serializers.CharField(max_length=10), required=False,
+                                   allow_empty=False)
+    floors = serializers.IntegerField(min_value=1)
+    first_floor = serializers.IntegerField(default=1)
+    rooms_per_floor = serializers.IntegerField(min_value=1)
+    pattern = serializers.CharField(default='{block}{floor}{room:02d}')
+    capacity = serializers.IntegerField(min_value=1, default=1)
+    
+    def validate_pattern(self, value):
+        """
+        Only bare {block}, {floor} and {room} fields with a short numeric
+        format spec are allowed, so a pattern cannot reach attributes or
+        items of the values or produce huge strings
+        """
+        error = "Pattern may only use the {block}, {floor} and {room} fields, e.g. {room:02d}."
+        try:
+            fields = [(name, conversion, spec) for _, name, spec, conversion
+                      in string.Formatter().parse(value) if name is not None]
+        except ValueError:  # Unbalanced braces
+            raise serializers.ValidationError(error)
+        for name, conversion, spec in fields:
+            if name not in self.PATTERN_FIELDS or conversion is not None \
+                    or not self.PATTERN_FORMAT_SPEC.fullmatch(spec or ''):
+                raise serializers.ValidationError(error)
+        return value
+    
+    def validate(self, attrs):
+        total = len(attrs.get('blocks', [''])) * attrs['floors'] * attrs['rooms_per_floor']
+        if total > self.MAX_ROOMS:
+            raise serializers.ValidationError(f"A layout can create at most {self.MAX_ROOMS} rooms.")
+        
+        try:
+            rooms = self.expand(attrs)
+        except (KeyError, IndexError, ValueError):
+            raise serializers.ValidationError(
+                {"pattern": "Pattern may only use the {block}, {floor} and {room} fields."}
+            )
+        
+        room_numbers = [room_number for room_number, _ in rooms]
+        max_length = Room._meta.get_field('room_number').max_length
+        if any(len(number) > max_length for number in room_numbers):
+            raise serializers.ValidationError(
+                {"pattern": f"Room numbers must be at most {max_length} characters."}
+            )
+        if len(set(room_numbers)) != len(room_numbers):
+            raise serializers.ValidationError({"pattern": "Pattern produces duplicate room numbers."})
+        
+        attrs['rooms'] = rooms
+        attrs['room_numbers'] = room_numbers
+        return attrs
+    
+    def expand(self, attrs):
+        """
+        Returns (room_number, floor) for every room in the layout
+        """
+        return [
+            (attrs['pattern'].format(block=block, floor=floor, room=room), floor)
+            for block in attrs.get('blocks', [''])
+            for floor in range(attrs['first_floor'], attrs['first_floor'] + attrs['floors'])
+            for room in range(1, attrs['rooms_per_floor'] + 1)
+        ]
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import Club, ClubMembership, Event, EventParticipation, User
+
+
+class EventCheckInTests(TestCase):
+    """
+    Bulk check-in is idempotent: resubmitted or out-of-order batches leave
+    everyone checked in with their earliest time
+    """
+    def setUp(self):
+        self.club = Club.objects.create(name='Quiz', type='Literary')
+        self.event = Event.objects.create(
+            name='Finals', club=self.club, location='Hall',
+            date_time=timezone.now() + timedelta(days=1), capacity=2
+        )
+        User.objects.bulk_create([
+            User(id_no=f'2023A7PS{i:04d}G', email=f's{i}@example.com', name=f'Student {i}')
+            for i in range(4)
+        ])
+        self.ids = list(User.objects.order_by('id_no').values_list('id_no', flat=True))
+        for user_id in self.ids[:3]:
+            EventParticipation.register(self.event, user_id)  # The third is waitlisted
+        self.organizer = User.objects.create_user('ORG', 'org@example.com', 'Organizer', 'pw')
+        ClubMembership.objects.create(user=self.organizer, club=self.club, role='leader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+
+    def check_in(self, check_ins):
+        return self.client.post(f'/api/events/{self.event.id}/check-in/', {'check_ins': check_ins},
+                                format='json')
+
+    def attended_at(self, user_id):
+        return EventParticipation.objects.get(event=self.event, user_id=user_id).attended_at
+
+    def test_reports_outcomes(self):
+        response = self.check_in([self.ids[0], self.ids[2], self.ids[3], 'NOBODY'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ids'], {
+            'checked_in': [self.ids[0]],
+            'already_checked_in': [],
+            'waitlisted': [self.ids[2]],
+            'not_registered': [self.ids[3]],
+            'unknown_users': ['NOBODY'],
+        })
+        self.assertFalse(EventParticipation.objects.get(event=self.event, user_id=self.ids[2]).attended)
+
+    def test_keeps_earliest_time(self):
+        late = datetime(2026, 3, 1, 18, 30, tzinfo=dt_timezone.utc)
+        early = late - timedelta(minutes=20)
+
+        self.check_in([{'user_id': self.ids[0], 'time': late.isoformat()}])
+        response = self.check_in([{'user_id': self.ids[0], 'time': early.isoformat()},
+                                  {'user_id': self.ids[1], 'time': late.isoformat()}])
+        self.assertEqual(response.data['ids']['already_checked_in'], [self.ids[0]])
+        self.assertEqual(self.attended_at(self.ids[0]), early)
+
+        # Resubmitting the later batch changes nothing
+        self.check_in([{'user_id': self.ids[0], 'time': late.isoformat()}])
+        self.assertEqual(self.attended_at(self.ids[0]), early)
+        self.assertEqual(self.attended_at(self.ids[1]), late)
+
+    def test_duplicates_in_one_batch_keep_earliest(self):
+        late = datetime(2026, 3, 1, 18, 30, tzinfo=dt_timezone.utc)
+        early = late - timedelta(hours=1)
+        self.check_in([{'user_id': self.ids[0], 'time': late.isoformat()},
+                       {'user_id': self.ids[0], 'time': early.isoformat()}])
+        self.assertEqual(self.attended_at(self.ids[0]), early)
+
+    def test_rejects_bad_input(self):
+        self.assertEqual(self.check_in([]).status_code, 400)
+        self.assertEqual(self.check_in([{'user_id': self.ids[0], 'time': 'soon'}]).status_code, 400)
+        self.assertEqual(self.check_in([{'time': '2026-03-01T18:00:00Z'}]).status_code, 400)
+
+    def test_only_club_members_can_check_in(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.ids[0]))
+        response = client.post(f'/api/events/{self.event.id}/check-in/', {'check_ins': [self.ids[0]]},
+                               format='json')
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,128 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import Club, ClubMembership, User
+
+
+class ClubMemberCounterTests(TestCase):
+    """
+    The member and per-role counters on Club must match its memberships
+    """
+    def setUp(self):
+        self.club = Club.objects.create(name='Robotics', type='Technical')
+        self.other_club = Club.objects.create(name='Drama', type='Cultural')
+        self.users = [
+            User.objects.create_user(f'2023A7PS{i:04d}G', f'u{i}@example.com', f'User {i}', 'pw')
+            for i in range(4)
+        ]
+
+    def assertCountersMatch(self, club):
+        club.refresh_from_db()
+        memberships = ClubMembership.objects.filter(club=club)
+        self.assertEqual(club.members_count, memberships.count())
+        for role, field in Club.ROLE_COUNTERS.items():
+            self.assertEqual(getattr(club, field), memberships.filter(role=role).count())
+
+    def test_counters_follow_memberships(self):
+        memberships = [
+            ClubMembership.objects.create(user=user, club=self.club, role=role)
+            for user, role in zip(self.users, ['member', 'member', 'leader', 'coordinator'])
+        ]
+        self.assertCountersMatch(self.club)
+        self.club.refresh_from_db()
+        self.assertEqual(self.club.role_counts, {'member': 2, 'leader': 1, 'coordinator': 1})
+
+        memberships[0].role = 'leader'
+        memberships[0].save()
+        self.assertCountersMatch(self.club)
+
+        memberships[1].club = self.other_club
+        memberships[1].save()
+        self.assertCountersMatch(self.club)
+        self.assertCountersMatch(self.other_club)
+
+        memberships[2].delete()
+        self.assertCountersMatch(self.club)
+
+    def test_decrement_stops_at_zero(self):
+        membership = ClubMembership.objects.create(user=self.users[0], club=self.club, role='leader')
+        # Counters that were never backfilled
+        Club.objects.filter(pk=self.club.pk).update(members_count=0, leaders_count=0)
+        membership.delete()
+        self.club.refresh_from_db()
+        self.assertEqual((self.club.members_count, self.club.leaders_count), (0, 0))
+        self.assertEqual(self.club.role_counts['member'], 0)
+
+    def test_deleting_a_user_updates_counters(self):
+        ClubMembership.objects.create(user=self.users[0], club=self.club, role='leader')
+        ClubMembership.objects.create(user=self.users[0], club=self.other_club)
+        ClubMembership.objects.create(user=self.users[1], club=self.club)
+        self.users[0].delete()
+        self.assertCountersMatch(self.club)
+        self.assertCountersMatch(self.other_club)
+        self.other_club.refresh_from_db()
+        self.assertEqual(self.other_club.members_count, 0)
+
+    def test_recount_repairs_drift(self):
+        ClubMembership.objects.create(user=self.users[0], club=self.club, role='coordinator')
+        ClubMembership.objects.create(user=self.users[1], club=self.club)
+        Club.objects.filter(pk=self.club.pk).update(members_count=9, coordinators_count=0)
+        call_command('recount_club_members', stdout=StringIO())
+        self.assertCountersMatch(self.club)
+        self.assertCountersMatch(self.other_club)
+
+
+class ClubMembershipUpdateTests(TestCase):
+    """
+    Only admins, and leaders for other members of their club, may change a
+    membership, and a membership stays with its user and club
+    """
+    def setUp(self):
+        self.club = Club.objects.create(name='Robotics', type='Technical')
+        self.leader, self.coordinator, self.member = [
+            User.objects.create_user(f'2023A7PS{i:04d}G', f'u{i}@example.com', f'User {i}', 'pw')
+            for i in range(3)
+        ]
+        self.memberships = {
+            user: ClubMembership.objects.create(user=user, club=self.club, role=role)
+            for user, role in [(self.leader, 'leader'), (self.coordinator, 'coordinator'),
+                               (self.member, 'member')]
+        }
+
+    def patch(self, user, membership, data):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.patch(f'/api/club-memberships/{membership.id}/', data)
+
+    def roles(self):
+        return dict(ClubMembership.objects.values_list('user_id', 'role'))
+
+    def test_cannot_promote_self(self):
+        for user in [self.coordinator, self.member]:
+            response = self.patch(user, self.memberships[user], {'role': 'leader'})
+            self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.roles(), {self.leader.pk: 'leader', self.coordinator.pk: 'coordinator',
+                                        self.member.pk: 'member'})
+
+    def test_leader_changes_other_roles_only(self):
+        response = self.patch(self.leader, self.memberships[self.member], {'role': 'coordinator'})
+        self.assertEqual(response.status_code, 200)
+        response = self.patch(self.leader, self.memberships[self.leader], {'role': 'member'})
+        self.assertEqual(response.status_code, 403)
+        # Coordinators cannot change other members' roles
+        response = self.patch(self.coordinator, self.memberships[self.member], {'role': 'member'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.roles(), {self.leader.pk: 'leader', self.coordinator.pk: 'coordinator',
+                                        self.member.pk: 'coordinator'})
+
+    def test_user_and_club_are_read_only_on_update(self):
+        other_club = Club.objects.create(name='Drama', type='Cultural')
+        response = self.patch(self.leader, self.memberships[self.member],
+                              {'user_id': self.leader.pk, 'club_name': other_club.pk, 'role': 'leader'})
+        self.assertEqual(response.status_code, 200)
+        membership = ClubMembership.objects.get(pk=self.memberships[self.member].pk)
+        self.assertEqual((membership.user_id, membership.club_id, membership.role),
+                         (self.member.pk, self.club.pk, 'leader'))
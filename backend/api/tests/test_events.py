@@ -0,0 +1,134 @@
+from datetime import timedelta
+
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import Club, ClubMembership, Event, EventParticipation, EventSeatCounter, User
+
+
+class EventRegistrationTests(TestCase):
+    """
+    Seat counters must always hold exactly one seat per registered
+    participant, and freed seats go to the waitlist in registration order
+    """
+    def setUp(self):
+        self.club = Club.objects.create(name='Music', type='Cultural')
+        self.event = Event.objects.create(
+            name='Open mic', club=self.club, location='Auditorium',
+            date_time=timezone.now() + timedelta(days=1), capacity=3
+        )
+        User.objects.bulk_create([
+            User(id_no=f'2023A7PS{i:04d}G', email=f's{i}@example.com', name=f'Student {i}')
+            for i in range(8)
+        ])
+        self.user_ids = list(User.objects.order_by('id_no').values_list('id_no', flat=True))
+
+    def register(self, *indexes):
+        return [EventParticipation.register(self.event, self.user_ids[i]).status for i in indexes]
+
+    def statuses(self):
+        return list(EventParticipation.objects.filter(event=self.event).order_by(
+            'registered_at', 'id'
+        ).values_list('user_id', 'status'))
+
+    def assertSeatsMatchRegistrations(self):
+        taken = self.event.seat_counters.aggregate(taken=Sum('taken'))['taken'] or 0
+        registered = EventParticipation.objects.filter(event=self.event, status='registered').count()
+        self.assertEqual(taken, registered)
+
+    def test_capacity_and_waitlist(self):
+        self.assertEqual(self.register(0, 1, 2, 3, 4),
+                         ['registered'] * 3 + ['waitlisted'] * 2)
+        self.assertEqual(self.event.seat_counters.aggregate(capacity=Sum('capacity'))['capacity'], 3)
+        self.assertSeatsMatchRegistrations()
+
+    def test_duplicate_registration_gives_seat_back(self):
+        self.register(0)
+        with self.assertRaises(IntegrityError):
+            self.register(0)
+        self.assertSeatsMatchRegistrations()
+
+    def test_unregister_promotes_in_registration_order(self):
+        self.register(0, 1, 2, 3, 4, 5)
+        EventParticipation.objects.get(event=self.event, user_id=self.user_ids[1]).delete()
+        EventParticipation.objects.get(event=self.event, user_id=self.user_ids[0]).delete()
+        statuses = dict(self.statuses())
+        self.assertEqual(statuses[self.user_ids[3]], 'registered')
+        self.assertEqual(statuses[self.user_ids[4]], 'registered')
+        self.assertEqual(statuses[self.user_ids[5]], 'waitlisted')
+        self.assertSeatsMatchRegistrations()
+
+    def test_newcomer_does_not_jump_the_waitlist(self):
+        self.register(0, 1, 2, 3)
+        # An unregistration caught between release_seat and promote_waitlist:
+        # the seat is free but the waitlist has not been served yet
+        EventParticipation.objects.filter(event=self.event, user_id=self.user_ids[0]).delete()
+        EventSeatCounter.release_seat(self.event.id)
+
+        self.assertEqual(self.register(4), ['waitlisted'])
+        statuses = dict(self.statuses())
+        self.assertEqual(statuses[self.user_ids[3]], 'registered')
+        self.assertSeatsMatchRegistrations()
+
+    def test_delete_of_promoted_row_loaded_as_waitlisted_releases_seat(self):
+        self.register(0, 1, 2, 3, 4)
+        stale = EventParticipation.objects.get(event=self.event, user_id=self.user_ids[3])
+        EventParticipation.objects.get(event=self.event, user_id=self.user_ids[0]).delete()
+        self.assertEqual(stale.status, 'waitlisted')  # Promoted since it was loaded
+
+        stale.delete()
+        statuses = dict(self.statuses())
+        self.assertEqual(statuses[self.user_ids[4]], 'registered')
+        self.assertSeatsMatchRegistrations()
+
+    def test_capacity_changes(self):
+        self.register(0, 1, 2, 3, 4)
+        self.event.capacity = 4
+        self.event.save()
+        self.assertEqual(dict(self.statuses())[self.user_ids[3]], 'registered')
+        self.assertSeatsMatchRegistrations()
+
+        # Lowering the capacity keeps everyone registered but frees no seat
+        self.event.capacity = 2
+        self.event.save()
+        EventParticipation.objects.get(event=self.event, user_id=self.user_ids[0]).delete()
+        self.assertEqual(dict(self.statuses())[self.user_ids[4]], 'waitlisted')
+        self.assertSeatsMatchRegistrations()
+
+        self.event.capacity = None
+        self.event.save()
+        self.assertEqual({status for _, status in self.statuses()}, {'registered'})
+        self.assertFalse(self.event.seat_counters.exists())
+
+    def test_register_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.user_ids[0]))
+        response = client.post(f'/api/events/{self.event.id}/register/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], 'registered')
+        response = client.post(f'/api/events/{self.event.id}/register/')
+        self.assertEqual(response.status_code, 400)
+        response = client.post(f'/api/events/{self.event.id}/unregister/')
+        self.assertEqual(response.status_code, 204)
+        self.assertSeatsMatchRegistrations()
+
+    def test_participation_update_checks_the_event_club(self):
+        self.register(0, 1)
+        ClubMembership.objects.create(user_id=self.user_ids[0], club=self.club)
+        for index, expected in [(0, 200), (1, 403)]:
+            participation = EventParticipation.objects.get(event=self.event, user_id=self.user_ids[index])
+            client = APIClient()
+            client.force_authenticate(User.objects.get(pk=self.user_ids[index]))
+            response = client.patch(f'/api/event-participations/{participation.id}/', {'attended': True})
+            self.assertEqual(response.status_code, expected)
+
+    def test_deleting_a_user_frees_their_seat(self):
+        self.event.capacity = 1
+        self.event.save()
+        self.register(0, 1)
+        User.objects.get(pk=self.user_ids[0]).delete()
+        self.assertEqual(self.statuses(), [(self.user_ids[1], 'registered')])
+        self.assertSeatsMatchRegistrations()
@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import (
+    Club, ClubMembership, Event, EventParticipation, FeedEntry, Friend, User
+)
+
+
+class FeedTests(TestCase):
+    """
+    The incrementally maintained feed must always equal a feed rebuilt from
+    scratch from memberships, friendships and participations
+    """
+    def setUp(self):
+        User.objects.bulk_create([
+            User(id_no=name, email=f'{name.lower()}@example.com', name=name)
+            for name in ['ALICE', 'BOB', 'CAROL']
+        ])
+        self.chess = Club.objects.create(name='Chess', type='Sports')
+        self.dance = Club.objects.create(name='Dance', type='Cultural')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tournament = self.create_event('Tournament', self.chess, days=3)
+            self.workshop = self.create_event('Workshop', self.dance, days=1)
+            self.recital = self.create_event('Recital', self.dance, days=2)
+
+    def create_event(self, name, club, days):
+        return Event.objects.create(name=name, club=club, location='Campus',
+                                    date_time=timezone.now() + timedelta(days=days))
+
+    def change(self):
+        """
+        Runs the feed refreshes scheduled by the changes in the block
+        """
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def feed(self, user_id):
+        return {
+            entry.event.name: (entry.registered, entry.from_club, entry.friends_going)
+            for entry in FeedEntry.objects.filter(user_id=user_id).select_related('event')
+        }
+
+    def assertFeedsMatchRebuild(self):
+        incremental = {user_id: self.feed(user_id) for user_id in ['ALICE', 'BOB', 'CAROL']}
+        for user_id in incremental:
+            FeedEntry.rebuild(user_id)
+        self.assertEqual(incremental, {user_id: self.feed(user_id) for user_id in incremental})
+
+    def befriend(self, user_id, friend_id):
+        Friend.objects.create(user_id=user_id, friend_id=friend_id)
+        Friend.objects.create(user_id=friend_id, friend_id=user_id)
+
+    def test_joining_and_leaving_a_club(self):
+        with self.change():
+            membership = ClubMembership.objects.create(user_id='ALICE', club=self.chess)
+        self.assertEqual(self.feed('ALICE'), {'Tournament': (False, True, 0)})
+        self.assertFeedsMatchRebuild()
+
+        with self.change():
+            membership.delete()
+        self.assertEqual(self.feed('ALICE'), {})
+        self.assertFeedsMatchRebuild()
+
+    def test_friends_going_and_unfriending(self):
+        with self.change():
+            self.befriend('ALICE', 'BOB')
+            self.befriend('ALICE', 'CAROL')
+            EventParticipation.register(self.workshop, 'BOB')
+            EventParticipation.register(self.workshop, 'CAROL')
+        self.assertEqual(self.feed('ALICE'), {'Workshop': (False, False, 2)})
+        self.assertEqual(self.feed('BOB')['Workshop'], (True, False, 0))
+        self.assertFeedsMatchRebuild()
+
+        with self.change():
+            Friend.objects.get(user_id='ALICE', friend_id='BOB').delete()
+        self.assertEqual(self.feed('ALICE'), {'Workshop': (False, False, 1)})
+
+        with self.change():
+            Friend.objects.get(user_id='ALICE', friend_id='CAROL').delete()
+        self.assertEqual(self.feed('ALICE'), {})
+        self.assertFeedsMatchRebuild()
+
+    def test_unregistering(self):
+        with self.change():
+            self.befriend('ALICE', 'BOB')
+            EventParticipation.register(self.recital, 'BOB')
+        with self.change():
+            EventParticipation.objects.get(user_id='BOB', event=self.recital).delete()
+        self.assertEqual(self.feed('ALICE'), {})
+        self.assertEqual(self.feed('BOB'), {})
+        self.assertFeedsMatchRebuild()
+
+    def test_new_event_and_club_change(self):
+        with self.change():
+            ClubMembership.objects.create(user_id='ALICE', club=self.chess)
+            ClubMembership.objects.create(user_id='BOB', club=self.dance)
+        with self.change():
+            simul = self.create_event('Simul', self.chess, days=4)
+        self.assertIn('Simul', self.feed('ALICE'))
+
+        with self.change():
+            simul.club = self.dance
+            simul.save()
+        self.assertNotIn('Simul', self.feed('ALICE'))
+        self.assertIn('Simul', self.feed('BOB'))
+        self.assertFeedsMatchRebuild()
+
+    def test_past_entries_are_pruned(self):
+        with self.change():
+            ClubMembership.objects.create(user_id='ALICE', club=self.dance)
+        FeedEntry.objects.filter(event=self.workshop).update(event_time=timezone.now() - timedelta(hours=1))
+        self.assertEqual(FeedEntry.prune_past(), 1)
+        self.assertEqual(set(self.feed('ALICE')), {'Recital'})
+
+    def test_feed_endpoint_ranking(self):
+        with self.change():
+            ClubMembership.objects.create(user_id='ALICE', club=self.dance)
+            self.befriend('ALICE', 'BOB')
+            EventParticipation.register(self.tournament, 'BOB')
+            EventParticipation.register(self.recital, 'ALICE')
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk='ALICE'))
+        response = client.get('/api/events/feed/')
+        self.assertEqual(response.status_code, 200)
+        # Registered first, then club events, then events friends go to
+        self.assertEqual([entry['event']['name'] for entry in response.data['results']],
+                         ['Recital', 'Workshop', 'Tournament'])
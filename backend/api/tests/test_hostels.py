@@ -0,0 +1,93 @@
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import Hostel, Occupancy, Room, User
+
+
+class RoomOccupancyCounterTests(TestCase):
+    """
+    Room.occupied_beds must always equal the number of open stays in the room
+    """
+    def setUp(self):
+        self.hostel = Hostel.objects.create(hostel_name='Ram Bhawan')
+        self.room = Room.objects.create(hostel=self.hostel, room_number='101', capacity=2)
+        self.other_room = Room.objects.create(hostel=self.hostel, room_number='102', capacity=3)
+        self.students = [
+            User.objects.create_user(f'2023A7PS{i:04d}G', f's{i}@example.com', f'Student {i}', 'pw')
+            for i in range(3)
+        ]
+        self.admin = User.objects.create_user('ADMIN', 'admin@example.com', 'Admin', 'pw',
+                                              user_type='maintainer')
+
+    def occupied(self, room):
+        room.refresh_from_db()
+        return room.occupied_beds
+
+    def open_stays(self, room):
+        return Occupancy.objects.current().filter(room=room).count()
+
+    def test_counter_follows_stays(self):
+        stay = Occupancy.objects.create(occupant=self.students[0], room=self.room, from_date=date.today())
+        Occupancy.objects.create(occupant=self.students[1], room=self.room, from_date=date.today())
+        self.assertEqual(self.occupied(self.room), 2)
+
+        stay.room = self.other_room
+        stay.save()
+        self.assertEqual(self.occupied(self.room), self.open_stays(self.room))
+        self.assertEqual(self.occupied(self.other_room), self.open_stays(self.other_room))
+
+        stay.to_date = date.today()
+        stay.save()
+        self.assertEqual(self.occupied(self.other_room), 0)
+
+    def test_bulk_move_deltas_keep_counter(self):
+        Occupancy.objects.create(occupant=self.students[0], room=self.room, from_date=date.today())
+        deltas = Occupancy.move({self.students[0].pk: self.other_room.id,
+                                 self.students[1].pk: self.other_room.id}, date.today())
+        Room.adjust_occupied_beds(deltas)
+        self.assertEqual(self.occupied(self.room), self.open_stays(self.room))
+        self.assertEqual(self.occupied(self.other_room), self.open_stays(self.other_room))
+
+    def test_decrement_stops_at_zero(self):
+        stay = Occupancy.objects.create(occupant=self.students[0], room=self.room, from_date=date.today())
+        # A counter that was never backfilled
+        Room.objects.filter(id=self.room.id).update(occupied_beds=0)
+        stay.delete()
+        self.assertEqual(self.occupied(self.room), 0)
+
+    def test_deleting_user_releases_bed(self):
+        Occupancy.objects.create(occupant=self.students[0], room=self.room, from_date=date.today())
+        self.students[0].delete()
+        self.assertEqual(self.occupied(self.room), 0)
+
+    def test_recount_repairs_drift(self):
+        Occupancy.objects.create(occupant=self.students[0], room=self.room, from_date=date.today())
+        Room.objects.filter(id=self.room.id).update(occupied_beds=5)
+        call_command('recount_occupied_beds', stdout=StringIO())
+        self.assertEqual(self.occupied(self.room), 1)
+
+    def test_vacant_rooms(self):
+        Occupancy.objects.create(occupant=self.students[0], room=self.room, from_date=date.today())
+        Room.objects.filter(id=self.other_room.id).update(occupied_beds=5)  # Overbooked
+        client = APIClient()
+        client.force_authenticate(self.students[2])
+
+        response = client.get('/api/rooms/vacant/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['room_number'], row['free_beds']) for row in response.data], [('101', 1)])
+        self.assertEqual(client.get('/api/rooms/vacant/?min_beds=2').data, [])
+
+    def test_capacity_cannot_drop_below_occupants(self):
+        for student in self.students[:2]:
+            Occupancy.objects.create(occupant=student, room=self.room, from_date=date.today())
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        response = client.patch(f'/api/rooms/{self.room.id}/', {'capacity': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.patch(f'/api/rooms/{self.room.id}/', {'capacity': 2}, format='json')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,22 @@
+import os
+import time
+import uuid
+
+
+def uuid7(timestamp_ms=None):
+    """
+    Generates a time-ordered UUID (version 7, RFC 9562).
+
+    The first 48 bits hold the Unix timestamp in milliseconds and the rest is
+    random, so ids created later sort after earlier ones. Used as primary key
+    default for fast-growing tables, where random uuid4 keys scatter inserts
+    across the clustered index and cause page splits.
+    """
+    if timestamp_ms is None:
+        timestamp_ms = time.time_ns() // 1_000_000
+    value = (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= int.from_bytes(os.urandom(10), 'big')
+    # Set the version (7) and variant (0b10) bits
+    value = (value & ~(0xF << 76)) | (0x7 << 76)
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)
+    return uuid.UUID(int=value)
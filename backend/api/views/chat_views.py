@@ -1,7 +1,16 @@
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from ..models import Chat, Message, GroupChat
+from ..models import Chat, Message, GroupChat, ChatReadState
+from ..consumers import ChatListener, broadcast_message, subscribe_user, unsubscribe_user
+from ..pagination import MessageCursorPagination
 from ..serializers.chat_serializers import (
     ChatSerializer, ChatDetailSerializer, ChatCreateSerializer,
     MessageSerializer, GroupChatSerializer
@@ -48,8 +57,10 @@ class ChatViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsChatParticipant]
     
     def get_serializer_class(self):
-        if self.action == 'retrieve' or self.action == 'messages':
+        if self.action == 'retrieve':
             return ChatDetailSerializer
+        elif self.action == 'messages':
+            return MessageSerializer
         elif self.action == 'create':
             return ChatCreateSerializer
         return ChatSerializer
@@ -61,8 +72,17 @@ class ChatViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
         if user.user_type in ['developer', 'maintainer']:
-            return Chat.objects.all()
-        return Chat.objects.filter(participants=user)
+            queryset = Chat.objects.all()
+        else:
+            queryset = Chat.objects.filter(participants=user)
+        
+        if self.action == 'list':
+            # Most recently active chats first; participants and group info
+            # are loaded up front so the list costs a constant number of queries
+            queryset = queryset.select_related('group_info').prefetch_related(
+                'participants'
+            ).order_by(F('last_message_at').desc(nulls_last=True), '-updated_at')
+        return queryset
     
     def get_permissions(self):
         """
@@ -70,7 +90,7 @@ class ChatViewSet(viewsets.ModelViewSet):
         - Anyone can create a chat
         - Only participants can view or interact with a chat
         """
-        if self.action == 'create':
+        if self.action in ['create', 'direct']:
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAuthenticated, IsChatParticipant]
@@ -82,22 +102,138 @@ class ChatViewSet(viewsets.ModelViewSet):
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         
-        # Return detailed chat info
+        # Push the new chat to its participants' open connections
         chat = Chat.objects.get(chat_id=serializer.data['chat_id'])
+        for participant_id in chat.participants.values_list('id_no', flat=True):
+            subscribe_user(participant_id, chat.chat_id)
+        
+        # Return detailed chat info
         return Response(
             ChatDetailSerializer(chat, context={'request': request}).data,
             status=status.HTTP_201_CREATED,
             headers=headers
         )
     
+    def list(self, request, *args, **kwargs):
+        """
+        Lists the user's chats with unread counts from one aggregate query
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        context = self.get_serializer_context()
+        context['unread_counts'] = ChatReadState.unread_counts(request.user)
+        serializer = ChatSerializer(queryset, many=True, context=context)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def direct(self, request):
+        """
+        Returns the direct chat between the current user and another user,
+        creating it if it does not exist yet
+        """
+        user_id = request.data.get('user_id')
+        if not user_id:
+            return Response(
+                {"detail": "user_id is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        user_id = str(user_id)
+        if user_id == request.user.id_no:
+            return Response(
+                {"detail": "Cannot start a direct chat with yourself."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        direct_key = Chat.make_direct_key(request.user.id_no, user_id)
+        chat = Chat.objects.filter(direct_key=direct_key).first()
+        if chat:
+            return Response(ChatDetailSerializer(chat, context={'request': request}).data)
+        
+        # Check if user exists
+        from ..models import User
+        try:
+            other_user = User.objects.get(id_no=user_id)
+        except User.DoesNotExist:
+            return Response(
+                {"detail": "User not found."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        try:
+            with transaction.atomic():
+                chat = Chat.objects.create(direct_key=direct_key)
+                chat.participants.add(request.user, other_user)
+        except IntegrityError:
+            # Another request created the same chat concurrently
+            chat = Chat.objects.get(direct_key=direct_key)
+            return Response(ChatDetailSerializer(chat, context={'request': request}).data)
+        
+        subscribe_user(request.user.pk, chat.chat_id)
+        subscribe_user(other_user.pk, chat.chat_id)
+        return Response(
+            ChatDetailSerializer(chat, context={'request': request}).data,
+            status=status.HTTP_201_CREATED
+        )
+    
+    def get_message_page(self, chat):
+        """
+        Returns one cursor-paginated page of a chat's message history
+        """
+        paginator = MessageCursorPagination()
+        messages = paginator.paginate_queryset(
+            chat.messages.select_related('sender'), self.request, view=self
+        )
+        serializer = MessageSerializer(messages, many=True, context={'request': self.request})
+        return paginator.get_paginated_data(serializer.data)
+    
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Returns the chat details along with the latest page of messages
+        """
+        chat = self.get_object()
+        data = ChatDetailSerializer(chat, context={'request': request}).data
+        data['messages'] = self.get_message_page(chat)
+        return Response(data)
+    
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
         """
-        Returns the messages in a chat
+        Returns a page of messages in a chat.
+        Use the 'before' cursor for older history and 'after' for newer messages
         """
         chat = self.get_object()
-        serializer = ChatDetailSerializer(chat)
-        return Response(serializer.data)
+        return Response(self.get_message_page(chat))
+    
+    @action(detail=True, methods=['post'])
+    def mark_read(self, request, pk=None):
+        """
+        Marks the chat as read up to a message (or up to the latest message)
+        """
+        chat = self.get_object()
+        message_id = request.data.get('message_id')
+        
+        if message_id:
+            try:
+                message_id = uuid.UUID(str(message_id))
+            except ValueError:
+                return Response(
+                    {"detail": "message_id must be a valid message ID."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            read_at = Message.objects.filter(id=message_id, chat=chat).values_list(
+                'date_time', flat=True
+            ).first()
+            if read_at is None:
+                return Response(
+                    {"detail": "Message not found in this chat."},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        else:
+            read_at = chat.last_message_at
+            if read_at is None:
+                return Response({'last_read_at': None})
+        
+        ChatReadState.advance(chat.chat_id, request.user, read_at)
+        return Response({'last_read_at': read_at})
     
     @action(detail=True, methods=['post'])
     def add_participant(self, request, pk=None):
@@ -145,8 +281,9 @@ class ChatViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Add user to participants
+        # Add user to participants and push the chat to their connections
         chat.participants.add(user)
+        subscribe_user(user.pk, chat.chat_id)
         
         # Return updated chat
         serializer = ChatDetailSerializer(chat)
@@ -205,8 +342,9 @@ class ChatViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Remove user from participants
+        # Remove user from participants and stop pushing the chat to their connections
         chat.participants.remove(user)
+        unsubscribe_user(user.pk, chat.chat_id)
         
         # Return updated chat
         serializer = ChatDetailSerializer(chat)
@@ -240,8 +378,9 @@ class ChatViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Remove user from participants
+        # Remove user from participants and stop pushing the chat to their connections
         chat.participants.remove(request.user)
+        unsubscribe_user(request.user.pk, chat.chat_id)
         
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -268,25 +407,95 @@ class MessageViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         # Set the sender to the current user
-        serializer.save(sender=self.request.user)
+        message = serializer.save(sender=self.request.user)
+        
+        # Push the message to connected WebSocket clients once it is committed
+        transaction.on_commit(lambda: broadcast_message(message))
+    
+    @action(detail=False, methods=['get'])
+    def poll(self, request):
+        """
+        Long-poll fallback for clients that cannot use WebSockets.
+        Returns messages from the user's chats newer than the 'since' cursor,
+        holding the request until one arrives or 'timeout' seconds pass.
+        Waiting happens on the channel layer, not by re-querying the database
+        """
+        paginator = MessageCursorPagination()
+        page_size = paginator.get_page_size(request)
+        
+        since = request.query_params.get('since')
+        if since:
+            date_time, message_id = paginator.decode_cursor(since)
+        else:
+            # No cursor yet: only report messages sent from now on
+            date_time, message_id = timezone.now(), uuid.UUID(int=0)
+            since = paginator.make_cursor(date_time, message_id)
+        paginator.after = since
+        
+        try:
+            timeout = float(request.query_params.get('timeout', settings.CHAT_LONG_POLL_TIMEOUT))
+        except ValueError:
+            timeout = settings.CHAT_LONG_POLL_TIMEOUT
+        timeout = max(0, min(timeout, settings.CHAT_LONG_POLL_TIMEOUT))
+        
+        chat_ids = list(Chat.objects.filter(participants=request.user).values_list('chat_id', flat=True))
+        queryset = Message.objects.filter(chat_id__in=chat_ids).select_related('sender')
+        
+        # Subscribe before the first check so nothing sent in between is missed
+        listener = ChatListener(chat_ids)
+        async_to_sync(listener.subscribe)()
+        try:
+            messages = paginator.paginate_after(queryset, date_time, message_id, page_size)
+            if not messages and timeout > 0 and async_to_sync(listener.wait)(timeout):
+                messages = paginator.paginate_after(queryset, date_time, message_id, page_size)
+        finally:
+            async_to_sync(listener.unsubscribe)()
+        
+        serializer = MessageSerializer(messages, many=True, context={'request': request})
+        return Response(paginator.get_paginated_data(serializer.data))
     
     @action(detail=False, methods=['post'])
     def mark_read(self, request):
         """
-        Marks messages as read
+        Marks messages as read by advancing the user's read cursor
+        in each affected chat to the newest of the given messages.
+        updated_count is the number of other users' messages that were
+        unread before the call
         """
         message_ids = request.data.get('message_ids', [])
+        if not isinstance(message_ids, list):
+            return Response(
+                {"detail": "message_ids must be a list of message IDs."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            message_ids = [uuid.UUID(str(message_id)) for message_id in message_ids]
+        except ValueError:
+            return Response(
+                {"detail": "message_ids must be a list of valid message IDs."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Get messages that the user can access and haven't been read
-        messages = Message.objects.filter(
+        # Newest given message per chat the user can access
+        latest_per_chat = Message.objects.filter(
             id__in=message_ids,
-            chat__participants=request.user,
-            is_read=False
-        ).exclude(sender=request.user)  # Don't mark user's own messages
+            chat__participants=request.user
+        ).order_by().values('chat_id').annotate(read_at=Max('date_time'))
+        latest_per_chat = {row['chat_id']: row['read_at'] for row in latest_per_chat}
+        previous_read_at = dict(ChatReadState.objects.filter(
+            chat_id__in=latest_per_chat, user=request.user
+        ).values_list('chat_id', 'last_read_at'))
         
-        # Mark as read
-        updated_count = messages.update(is_read=True)
+        # Messages between the old and the new cursor of every advanced chat
+        newly_read = Q(pk__in=[])
+        for chat_id, read_at in latest_per_chat.items():
+            if ChatReadState.advance(chat_id, request.user, read_at):
+                window = Q(chat_id=chat_id, date_time__lte=read_at)
+                if previous_read_at.get(chat_id) is not None:
+                    window &= Q(date_time__gt=previous_read_at[chat_id])
+                newly_read |= window
         
+        updated_count = Message.objects.filter(newly_read).exclude(sender=request.user).count()
         return Response({'updated_count': updated_count})
 
 
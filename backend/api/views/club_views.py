@@ -1,7 +1,11 @@
+from django.db.models import F, Q
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from ..exports import export_response
 from ..models import Club, ClubMembership
+from ..pagination import RosterPagination
+from ..permissions import club_roles
 from ..serializers.club_serializers import (
     ClubSerializer, ClubDetailSerializer, ClubMembershipSerializer, UserClubsSerializer
 )
@@ -33,12 +37,12 @@ class IsClubLeaderOrAdmin(permissions.BasePermission):
         if request.user.user_type in ['developer', 'maintainer']:
             return True
             
+        # Club leaders may change other members' roles, but not their own
+        if isinstance(obj, ClubMembership):
+            return obj.user_id != request.user.pk and club_roles(request).get(obj.club_id) == 'leader'
+            
         # Also allow club leaders to edit
-        try:
-            membership = ClubMembership.objects.get(user=request.user, club=obj)
-            return membership.role in ['leader', 'coordinator']
-        except ClubMembership.DoesNotExist:
-            return False
+        return club_roles(request).get(obj.pk) in ['leader', 'coordinator']
 
 
 class ClubViewSet(viewsets.ModelViewSet):
@@ -54,8 +58,16 @@ class ClubViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated, IsClubLeaderOrAdmin]
         return [permission() for permission in permission_classes]
     
+    # Sort keys accepted by the roster's ?ordering= parameter
+    ROSTER_ORDERING = {
+        'name': 'user__name',
+        'id_no': 'user_id',
+        'role': 'role',
+        'joined_date': 'joined_date',
+    }
+    
     def get_serializer_class(self):
-        if self.action == 'retrieve' or self.action == 'members':
+        if self.action == 'members':
             return ClubDetailSerializer
         return ClubSerializer
     
@@ -68,6 +80,61 @@ class ClubViewSet(viewsets.ModelViewSet):
         serializer = ClubDetailSerializer(club)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def roster(self, request, pk=None):
+        """
+        Returns a page of compact member rows (id, name, role, joined date).
+        Filter with ?role= and sort with ?ordering=name|id_no|role|joined_date
+        (prefix with - to reverse)
+        """
+        club = self.get_object()
+        memberships = ClubMembership.objects.filter(club=club)
+        
+        role = request.query_params.get('role')
+        if role is not None:
+            if role not in dict(ClubMembership.ROLE_CHOICES):
+                return Response(
+                    {"detail": "Invalid role."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            memberships = memberships.filter(role=role)
+        
+        ordering = request.query_params.get('ordering', 'name')
+        field = self.ROSTER_ORDERING.get(ordering.lstrip('-'))
+        if field is None:
+            return Response(
+                {"detail": f"ordering must be one of: {', '.join(self.ROSTER_ORDERING)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if ordering.startswith('-'):
+            field = '-' + field
+        
+        rows = memberships.order_by(field, 'id').values(
+            'role', 'joined_date', id_no=F('user_id'), name=F('user__name')
+        )
+        paginator = RosterPagination()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(page)
+    
+    @action(detail=True, methods=['get'], url_path='members/export')
+    def export_members(self, request, pk=None):
+        """
+        Streams the members of a club as CSV or NDJSON (?output=)
+        """
+        club = self.get_object()
+        return export_response(
+            request,
+            ClubMembership.objects.filter(club=club),
+            {
+                'id_no': 'user_id',
+                'name': 'user__name',
+                'email': 'user__email',
+                'role': 'role',
+                'joined_date': 'joined_date',
+            },
+            f'{club.name}-members'
+        )
+    
     @action(detail=True, methods=['post'])
     def join(self, request, pk=None):
         """
@@ -76,7 +143,7 @@ class ClubViewSet(viewsets.ModelViewSet):
         club = self.get_object()
         
         # Check if already a member
-        if ClubMembership.objects.filter(user=request.user, club=club).exists():
+        if club.pk in club_roles(request):
             return Response(
                 {"detail": "You are already a member of this club."},
                 status=status.HTTP_400_BAD_REQUEST
@@ -134,7 +201,7 @@ class ClubMembershipViewSet(viewsets.ModelViewSet):
         """
         Filter memberships by user or club
         """
-        queryset = ClubMembership.objects.all()
+        queryset = ClubMembership.objects.select_related('user', 'club')
         
         user_id = self.request.query_params.get('user', None)
         club_name = self.request.query_params.get('club', None)
@@ -145,17 +212,22 @@ class ClubMembershipViewSet(viewsets.ModelViewSet):
         if club_name is not None:
             queryset = queryset.filter(club__name=club_name)
             
-        # Regular users can only see their own memberships
+        # Regular users can only see their own memberships, and leaders can
+        # also update the memberships of the clubs they lead
         if self.request.user.user_type not in ['developer', 'maintainer']:
-            queryset = queryset.filter(user=self.request.user)
+            visible = Q(user=self.request.user)
+            if self.action in ['update', 'partial_update']:
+                led = [club_id for club_id, role in club_roles(self.request).items() if role == 'leader']
+                visible |= Q(club_id__in=led)
+            queryset = queryset.filter(visible)
             
         return queryset
     
     def get_permissions(self):
         """
         Custom permissions:
-        - Regular users can only update their own role if they're a leader
-        - Only admins can create, delete, or update other users' memberships
+        - Club leaders can update the roles of other members of their club
+        - Only admins can create or delete memberships, or update their own
         """
         if self.action in ['create', 'destroy']:
             permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
@@ -170,6 +242,6 @@ class ClubMembershipViewSet(viewsets.ModelViewSet):
         """
         Returns the clubs that the current user is a member of
         """
-        memberships = ClubMembership.objects.filter(user=request.user)
+        memberships = ClubMembership.objects.filter(user=request.user).select_related('club')
         serializer = UserClubsSerializer(memberships, many=True)
         return Response(serializer.data)
\ No newline at end of file
@@ -1,6 +1,8 @@
+from django.db import transaction
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from ..exports import export_response
 from ..models import Course, Enrollment, User
 from ..serializers.course_serializers import (
     CourseSerializer, CourseDetailSerializer, EnrollmentSerializer, CourseWithStudentsSerializer
@@ -43,6 +45,24 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = CourseWithStudentsSerializer(course)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'], url_path='students/export')
+    def export_students(self, request, pk=None):
+        """
+        Streams the students enrolled in a course as CSV or NDJSON (?output=)
+        """
+        course = self.get_object()
+        return export_response(
+            request,
+            Enrollment.objects.filter(course=course),
+            {
+                'id_no': 'user_id',
+                'name': 'user__name',
+                'email': 'user__email',
+                'branch': 'user__branch',
+            },
+            f'{course.course_id}-students'
+        )
+    
     @action(detail=True, methods=['post'])
     def enroll(self, request, pk=None):
         """
@@ -103,37 +123,69 @@ class CourseViewSet(viewsets.ModelViewSet):
             )
             
         results = {'success': [], 'failed': []}
+        user_ids = [str(user_id) for user_id in user_ids]
         
-        for user_id in user_ids:
-            try:
-                # Check if user exists
-                user = User.objects.get(id_no=user_id)
-                
-                # Check if enrollment already exists
-                if not Enrollment.objects.filter(user=user, course=course).exists():
-                    enrollment = Enrollment.objects.create(user=user, course=course)
-                    results['success'].append({
+        with transaction.atomic():
+            # Resolve all users and their existing enrollments up front
+            names = dict(User.objects.filter(id_no__in=user_ids).values_list('id_no', 'name'))
+            enrolled = set(Enrollment.objects.filter(
+                course=course, user_id__in=names
+            ).values_list('user_id', flat=True))
+            
+            new_enrollments = []
+            for user_id in user_ids:
+                if user_id not in names:
+                    results['failed'].append({
                         'user_id': user_id,
-                        'name': user.name
+                        'reason': 'User not found'
                     })
-                else:
+                elif user_id in enrolled:
                     results['failed'].append({
                         'user_id': user_id,
                         'reason': 'Already enrolled'
                     })
-            except User.DoesNotExist:
-                results['failed'].append({
-                    'user_id': user_id,
-                    'reason': 'User not found'
-                })
-            except Exception as e:
-                results['failed'].append({
-                    'user_id': user_id,
-                    'reason': str(e)
-                })
+                else:
+                    enrolled.add(user_id)
+                    new_enrollments.append(Enrollment(user_id=user_id, course=course))
+                    results['success'].append({
+                        'user_id': user_id,
+                        'name': names[user_id]
+                    })
+            
+            Enrollment.objects.bulk_create(new_enrollments, batch_size=1000, ignore_conflicts=True)
+            # bulk_create bypasses Enrollment.save, so refresh branches explicitly
+            User.objects.refresh_branches([e.user_id for e in new_enrollments])
         
         return Response(results)
     
+    @action(detail=False, methods=['post'])
+    def sync_rosters(self, request):
+        """
+        Replaces course rosters with authoritative lists of student ids (admin only).
+        Expects {"rosters": {"<course_id>": ["<user_id>", ...]}, "dry_run": false}
+        and applies only the enrollments that need to be added or dropped
+        """
+        if request.user.user_type not in ['developer', 'maintainer']:
+            return Response(
+                {"detail": "You do not have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        rosters = request.data.get('rosters')
+        if not isinstance(rosters, dict) or not rosters:
+            return Response(
+                {"detail": "rosters must map course IDs to lists of user IDs."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(isinstance(user_ids, list) for user_ids in rosters.values()):
+            return Response(
+                {"detail": "Each roster must be a list of user IDs."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        dry_run = str(request.data.get('dry_run', False)).lower() in ['true', '1']
+        return Response(Enrollment.sync_rosters(rosters, dry_run=dry_run))
+    
     @action(detail=True, methods=['post'])
     def bulk_unenroll(self, request, pk=None):
         """
@@ -155,35 +207,38 @@ class CourseViewSet(viewsets.ModelViewSet):
             )
             
         results = {'success': [], 'failed': []}
+        user_ids = [str(user_id) for user_id in user_ids]
         
-        for user_id in user_ids:
-            try:
-                # Check if user exists
-                user = User.objects.get(id_no=user_id)
-                
-                # Check if enrollment exists
-                try:
-                    enrollment = Enrollment.objects.get(user=user, course=course)
-                    enrollment.delete()
-                    results['success'].append({
+        with transaction.atomic():
+            # Resolve all users and their existing enrollments up front
+            names = dict(User.objects.filter(id_no__in=user_ids).values_list('id_no', 'name'))
+            enrolled = set(Enrollment.objects.filter(
+                course=course, user_id__in=names
+            ).values_list('user_id', flat=True))
+            
+            removed_ids = []
+            for user_id in user_ids:
+                if user_id not in names:
+                    results['failed'].append({
                         'user_id': user_id,
-                        'name': user.name
+                        'reason': 'User not found'
                     })
-                except Enrollment.DoesNotExist:
+                elif user_id not in enrolled:
                     results['failed'].append({
                         'user_id': user_id,
                         'reason': 'Not enrolled in this course'
                     })
-            except User.DoesNotExist:
-                results['failed'].append({
-                    'user_id': user_id,
-                    'reason': 'User not found'
-                })
-            except Exception as e:
-                results['failed'].append({
-                    'user_id': user_id,
-                    'reason': str(e)
-                })
+                else:
+                    enrolled.discard(user_id)
+                    removed_ids.append(user_id)
+                    results['success'].append({
+                        'user_id': user_id,
+                        'name': names[user_id]
+                    })
+            
+            Enrollment.objects.filter(course=course, user_id__in=removed_ids).delete()
+            # Queryset delete bypasses Enrollment.delete, so refresh branches explicitly
+            User.objects.refresh_branches(removed_ids)
         
         return Response(results)
 
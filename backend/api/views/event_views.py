@@ -1,10 +1,18 @@
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F, Prefetch
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
-from ..models import Event, EventParticipation, ClubMembership
+from django.utils.dateparse import parse_datetime
+from ..exports import export_response
+from ..models import Event, EventParticipation, FeedEntry
+from ..pagination import FeedPagination, RosterPagination
+from ..permissions import club_roles
 from ..serializers.event_serializers import (
-    EventSerializer, EventDetailSerializer, EventParticipationSerializer, UserEventsSerializer
+    EventSerializer, EventDetailSerializer, EventParticipationSerializer, UserEventsSerializer,
+    FeedEntrySerializer
 )
 
 
@@ -23,11 +31,7 @@ class IsClubMemberOrReadOnly(permissions.BasePermission):
             
         # For create, check if user is providing a club they're a member of
         if view.action == 'create' and 'club' in request.data:
-            try:
-                club_id = request.data['club']
-                return ClubMembership.objects.filter(user=request.user, club_id=club_id).exists()
-            except:
-                return False
+            return str(request.data['club']) in club_roles(request)
         
         return True  # Other actions checked with has_object_permission
     
@@ -39,9 +43,14 @@ class IsClubMemberOrReadOnly(permissions.BasePermission):
         # Write permissions are only allowed to admins or club members
         if request.user.user_type in ['developer', 'maintainer']:
             return True
+        
+        # Any student may register or unregister themselves
+        if view.action in ['register', 'unregister']:
+            return True
             
-        # Check if user is a club member
-        return ClubMembership.objects.filter(user=request.user, club=obj.club).exists()
+        # Check if user is a member of the club (obj is an event or one of its participations)
+        club_id = obj.event.club_id if isinstance(obj, EventParticipation) else obj.club_id
+        return club_id in club_roles(request)
 
 
 class EventViewSet(viewsets.ModelViewSet):
@@ -51,21 +60,29 @@ class EventViewSet(viewsets.ModelViewSet):
     queryset = Event.objects.all()
     permission_classes = [permissions.IsAuthenticated, IsClubMemberOrReadOnly]
     
+    # Sort keys accepted by the participant list's ?ordering= parameter
+    PARTICIPANT_ORDERING = {
+        'registered_at': 'registered_at',
+        'name': 'user__name',
+        'id_no': 'user_id',
+    }
+    
     def get_serializer_class(self):
-        if self.action == 'retrieve' or self.action == 'participants':
+        if self.action == 'retrieve':
             return EventDetailSerializer
         return EventSerializer
     
     def get_queryset(self):
         """
-        Optionally filter events by club or date range
+        Optionally filter events by club or date range. The club is joined
+        and participants counted in the same query, not once per event
         """
-        queryset = Event.objects.all()
+        queryset = Event.objects.select_related('club').with_participant_counts()
         
         # Filter by club
         club = self.request.query_params.get('club', None)
         if club is not None:
-            queryset = queryset.filter(club__name=club)
+            queryset = queryset.filter(club_id=club)
         
         # Filter by date range (future events by default)
         from_date = self.request.query_params.get('from_date', None)
@@ -83,14 +100,146 @@ class EventViewSet(viewsets.ModelViewSet):
         # Order by date
         return queryset.order_by('date_time')
     
+    @action(detail=False, methods=['get'])
+    def feed(self, request):
+        """
+        Returns a page of the current user's upcoming events: events of their
+        clubs, events friends are going to and events they registered for,
+        best ranked first. Read from the precomputed feed entries
+        """
+        entries = FeedEntry.objects.filter(
+            user=request.user, event_time__gte=timezone.now()
+        ).order_by('-score', 'event_time', 'event_id').prefetch_related(
+            Prefetch('event', queryset=Event.objects.select_related('club').with_participant_counts())
+        )
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        serializer = FeedEntrySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['get'])
     def participants(self, request, pk=None):
         """
-        Returns the participants of an event
+        Returns a page of compact participant rows (id, name, registration
+        time, status, attendance). Filter with ?status=registered|waitlisted
+        and ?attended=true|false, sort with ?ordering=registered_at|name|id_no
+        (prefix with - to reverse)
+        """
+        event = self.get_object()
+        participations = EventParticipation.objects.filter(event=event)
+        
+        participation_status = request.query_params.get('status')
+        if participation_status is not None:
+            if participation_status not in dict(EventParticipation.STATUS_CHOICES):
+                return Response(
+                    {"detail": "Invalid status."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            participations = participations.filter(status=participation_status)
+        
+        attended = request.query_params.get('attended')
+        if attended is not None:
+            participations = participations.filter(attended=attended.lower() in ['true', '1'])
+        
+        ordering = request.query_params.get('ordering', 'registered_at')
+        field = self.PARTICIPANT_ORDERING.get(ordering.lstrip('-'))
+        if field is None:
+            return Response(
+                {"detail": f"ordering must be one of: {', '.join(self.PARTICIPANT_ORDERING)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if ordering.startswith('-'):
+            field = '-' + field
+        
+        rows = participations.order_by(field, 'id').values(
+            'registered_at', 'status', 'attended', 'attended_at', id_no=F('user_id'), name=F('user__name')
+        )
+        paginator = RosterPagination()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(page)
+    
+    @action(detail=True, methods=['get'], url_path='participants/export')
+    def export_participants(self, request, pk=None):
+        """
+        Streams the participants of an event as CSV or NDJSON (?output=)
+        """
+        event = self.get_object()
+        return export_response(
+            request,
+            EventParticipation.objects.filter(event=event),
+            {
+                'id_no': 'user_id',
+                'name': 'user__name',
+                'email': 'user__email',
+                'registered_at': 'registered_at',
+                'status': 'status',
+                'attended': 'attended',
+                'attended_at': 'attended_at',
+            },
+            f'{event.name}-participants'
+        )
+    
+    @action(detail=True, methods=['post'], url_path='check-in')
+    def check_in(self, request, pk=None):
+        """
+        Marks participants as attended in bulk, e.g. from door scanners
+        (admins or club members). Takes "check_ins", a list of user IDs or
+        of {"user_id", "time"} objects (ISO 8601, default now). Safe to
+        resubmit: everyone keeps their earliest check-in time
         """
         event = self.get_object()
-        serializer = EventDetailSerializer(event)
-        return Response(serializer.data)
+        
+        entries = request.data.get('check_ins')
+        if not isinstance(entries, list) or not entries:
+            return Response(
+                {"detail": "check_ins must be a non-empty list."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(entries) > settings.EVENT_CHECK_IN_MAX_BATCH:
+            return Response(
+                {"detail": f"At most {settings.EVENT_CHECK_IN_MAX_BATCH} check-ins per request."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        now = timezone.now()
+        check_ins = {}
+        for index, entry in enumerate(entries):
+            if isinstance(entry, dict):
+                user_id, time = entry.get('user_id'), entry.get('time')
+            else:
+                user_id, time = entry, None
+            if not isinstance(user_id, (str, int)) or isinstance(user_id, bool) or user_id == '':
+                return Response(
+                    {"detail": f"check_ins[{index}]: user_id is required."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            if time is None:
+                time = now
+            else:
+                try:
+                    time = parse_datetime(str(time))
+                except ValueError:  # Well formed but not a real time
+                    time = None
+                if time is None:
+                    return Response(
+                        {"detail": f"check_ins[{index}]: time must be an ISO 8601 date and time."},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                if timezone.is_naive(time):
+                    time = timezone.make_aware(time)
+            
+            user_id = str(user_id)
+            # A user scanned twice in one batch keeps the earlier time
+            if user_id not in check_ins or time < check_ins[user_id]:
+                check_ins[user_id] = time
+        
+        report = EventParticipation.check_in(event.id, check_ins)
+        return Response({
+            'received': len(entries),
+            **{outcome: len(user_ids) for outcome, user_ids in report.items()},
+            'ids': report,
+        })
     
     @action(detail=True, methods=['post'])
     def register(self, request, pk=None):
@@ -113,8 +262,14 @@ class EventViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create participation
-        participation = EventParticipation.objects.create(user=request.user, event=event)
+        # Take a seat, or a place on the waitlist if the event is full
+        try:
+            participation = EventParticipation.register(event, request.user.pk)
+        except IntegrityError:
+            return Response(
+                {"detail": "You are already registered for this event."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         serializer = EventParticipationSerializer(participation)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
@@ -158,7 +313,9 @@ class EventParticipationViewSet(viewsets.ModelViewSet):
         """
         Filter participations by user or event
         """
-        queryset = EventParticipation.objects.all()
+        queryset = EventParticipation.objects.select_related('user').prefetch_related(
+            Prefetch('event', queryset=Event.objects.select_related('club').with_participant_counts())
+        )
         
         user_id = self.request.query_params.get('user', None)
         event_id = self.request.query_params.get('event', None)
@@ -191,6 +348,8 @@ class EventParticipationViewSet(viewsets.ModelViewSet):
         """
         Returns the events that the current user is registered for
         """
-        participations = EventParticipation.objects.filter(user=request.user)
+        participations = EventParticipation.objects.filter(user=request.user).prefetch_related(
+            Prefetch('event', queryset=Event.objects.select_related('club').with_participant_counts())
+        )
         serializer = UserEventsSerializer(participations, many=True)
         return Response(serializer.data)
\ No newline at end of file
@@ -1,10 +1,17 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from ..exports import export_response
 from ..models import Hostel, Room, Occupancy, User
+from ..models.hostel import get_dashboard_version, invalidate_occupancy_dashboard
 from ..serializers.hostel_serializers import (
     HostelSerializer, HostelDetailSerializer, RoomSerializer, 
-    RoomWithOccupantsSerializer, OccupancySerializer
+    RoomWithOccupantsSerializer, OccupancySerializer, RoomLayoutSerializer
 )
 from datetime import date
 
@@ -34,6 +41,15 @@ class HostelViewSet(viewsets.ModelViewSet):
             return HostelDetailSerializer
         return HostelSerializer
     
+    def get_queryset(self):
+        """
+        Annotates room counts and prefetches rooms so serializing hostels
+        does not run a query per row
+        """
+        if self.action in ['retrieve', 'rooms']:
+            return Hostel.objects.prefetch_related('rooms')
+        return Hostel.objects.annotate(num_rooms=Count('rooms'))
+    
     def perform_create(self, serializer):
         """
         When creating a hostel, automatically create a default room
@@ -52,7 +68,7 @@ class HostelViewSet(viewsets.ModelViewSet):
     def my_hostel(self, request):
         user = request.user
 
-        occupancy = Occupancy.objects.select_related('room__hostel').filter(occupant=request.user).first()
+        occupancy = Occupancy.objects.select_related('room__hostel').filter(current_occupant=request.user).first()
 
 
         if occupancy and occupancy.room and occupancy.room.hostel:
@@ -71,6 +87,94 @@ class HostelViewSet(viewsets.ModelViewSet):
         serializer = HostelDetailSerializer(hostel)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], url_path='dashboard')
+    def dashboard(self, request):
+        """
+        Returns room, resident and vacancy totals for every hostel
+        """
+        cache_key = f"hostel_dashboard:{get_dashboard_version()}:all"
+        data = cache.get(cache_key)
+        if data is None:
+            data = self.build_dashboard()
+            cache.set(cache_key, data, settings.HOSTEL_DASHBOARD_CACHE_TIMEOUT)
+        return Response(data)
+    
+    @action(detail=True, methods=['get'], url_path='dashboard')
+    def hostel_dashboard(self, request, pk=None):
+        """
+        Returns per-room residents and vacancy for one hostel
+        """
+        hostel = self.get_object()
+        cache_key = f"hostel_dashboard:{get_dashboard_version()}:{hostel.id}"
+        data = cache.get(cache_key)
+        if data is None:
+            data = self.build_hostel_dashboard(hostel)
+            cache.set(cache_key, data, settings.HOSTEL_DASHBOARD_CACHE_TIMEOUT)
+        return Response(data)
+    
+    def build_dashboard(self):
+        """
+        Computes the all-hostels dashboard from three grouped queries
+        """
+        rooms = {
+            row['hostel_id']: row
+            for row in Room.objects.order_by().values('hostel_id').annotate(
+                rooms=Count('id'), beds=Sum('capacity')
+            )
+        }
+        active = {
+            row['room__hostel_id']: row
+            for row in Occupancy.objects.filter(to_date__isnull=True).order_by().values(
+                'room__hostel_id'
+            ).annotate(residents=Count('pk'), occupied_rooms=Count('room', distinct=True))
+        }
+        
+        hostels = []
+        totals = {'rooms': 0, 'occupied_rooms': 0, 'vacant_rooms': 0,
+                  'beds': 0, 'free_beds': 0, 'residents': 0}
+        for hostel in Hostel.objects.order_by('hostel_name').values('id', 'hostel_name', 'warden'):
+            room_row = rooms.get(hostel['id'], {})
+            row = active.get(hostel['id'], {})
+            entry = {
+                **hostel,
+                'rooms': room_row.get('rooms', 0),
+                'occupied_rooms': row.get('occupied_rooms', 0),
+                'beds': room_row.get('beds') or 0,
+                'residents': row.get('residents', 0),
+            }
+            entry['vacant_rooms'] = entry['rooms'] - entry['occupied_rooms']
+            entry['free_beds'] = max(0, entry['beds'] - entry['residents'])
+            for key in totals:
+                totals[key] += entry[key]
+            hostels.append(entry)
+        
+        return {'hostels': hostels, 'totals': totals}
+    
+    def build_hostel_dashboard(self, hostel):
+        """
+        Computes one hostel's dashboard from a single grouped query
+        """
+        rooms = list(Room.objects.filter(hostel=hostel).annotate(
+            residents=Count('occupants', filter=Q(occupants__to_date__isnull=True))
+        ).order_by('room_number').values('id', 'room_number', 'capacity', 'residents'))
+        
+        occupied_rooms = sum(1 for room in rooms if room['residents'])
+        beds = sum(room['capacity'] for room in rooms)
+        residents = sum(room['residents'] for room in rooms)
+        return {
+            'id': hostel.id,
+            'hostel_name': hostel.hostel_name,
+            'rooms': rooms,
+            'totals': {
+                'rooms': len(rooms),
+                'occupied_rooms': occupied_rooms,
+                'vacant_rooms': len(rooms) - occupied_rooms,
+                'beds': beds,
+                'free_beds': max(0, beds - residents),
+                'residents': residents,
+            },
+        }
+    
     @action(detail=True, methods=['post'])
     def bulk_assign(self, request, pk=None):
         """
@@ -98,58 +202,157 @@ class HostelViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        try:
-            room = Room.objects.get(id=room_id, hostel=hostel)
-        except Room.DoesNotExist:
-            return Response(
-                {"detail": "Room not found in this hostel."},
-                status=status.HTTP_404_NOT_FOUND
-            )
-            
         results = {'success': [], 'failed': []}
+        user_ids = [str(user_id) for user_id in user_ids]
+        today = date.today()
         
-        for user_id in user_ids:
-            try:
-                # Check if user exists
-                user = User.objects.get(id_no=user_id)
+        try:
+            with transaction.atomic():
+                # Lock the room so concurrent assignments to it are serialized
+                try:
+                    room = Room.objects.select_for_update().get(id=room_id, hostel=hostel)
+                except Room.DoesNotExist:
+                    return Response(
+                        {"detail": "Room not found in this hostel."},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
                 
-                # Check if user already has an active occupancy
-                existing_occupancy = Occupancy.objects.filter(
-                    occupant=user, 
-                    to_date__isnull=True
-                ).first()
+                names = dict(User.objects.filter(id_no__in=user_ids).values_list('id_no', 'name'))
                 
-                if existing_occupancy:
-                    # End previous occupancy
-                    existing_occupancy.to_date = date.today()
-                    existing_occupancy.save()
+                # Lock the users' open stays so they cannot be moved concurrently
+                current_rooms = dict(Occupancy.objects.current().select_for_update().filter(
+                    occupant_id__in=names
+                ).values_list('occupant_id', 'room_id'))
                 
-                # Create new occupancy
-                Occupancy.objects.create(
-                    occupant=user,
-                    room=room,
-                    from_date=date.today()
-                )
+                assigned = set()
+                for user_id in user_ids:
+                    if user_id not in names:
+                        results['failed'].append({
+                            'user_id': user_id,
+                            'reason': 'User not found'
+                        })
+                        continue
+                    if user_id not in assigned:
+                        assigned.add(user_id)
+                        results['success'].append({
+                            'user_id': user_id,
+                            'name': names[user_id],
+                            'room': room.room_number
+                        })
                 
-                results['success'].append({
-                    'user_id': user_id,
-                    'name': user.name,
-                    'room': room.room_number
-                })
+                incoming = sum(1 for user_id in assigned if current_rooms.get(user_id) != room.id)
+                if incoming > room.free_beds:
+                    return Response(
+                        {"detail": f"Room {room.room_number} has only {room.free_beds} free beds."},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
                 
-            except User.DoesNotExist:
-                results['failed'].append({
-                    'user_id': user_id,
-                    'reason': 'User not found'
-                })
-            except Exception as e:
-                results['failed'].append({
-                    'user_id': user_id,
-                    'reason': str(e)
-                })
+                # Close the users' current stays and open new ones in this room
+                deltas = Occupancy.move(dict.fromkeys(assigned, room.id), today)
+                Room.adjust_occupied_beds(deltas)
+        except IntegrityError:
+            return Response(
+                {"detail": "Some of these users were assigned concurrently. Please retry."},
+                status=status.HTTP_409_CONFLICT
+            )
         
+        # Bulk writes bypass Occupancy.save, so invalidate the dashboards explicitly
+        invalidate_occupancy_dashboard()
         return Response(results)
 
+    @action(detail=False, methods=['post'])
+    def allocate(self, request):
+        """
+        Allocates a whole intake of students to vacant rooms (admin only).
+        Expects {"user_ids": [...], "hostel_ids": [...], "keep_friends": true,
+        "group_by_year": true, "dry_run": false}; hostel_ids defaults to all
+        hostels. With dry_run the planned assignment is returned unapplied
+        """
+        if request.user.user_type not in ['developer', 'maintainer']:
+            return Response(
+                {"detail": "You do not have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        user_ids = request.data.get('user_ids')
+        if not isinstance(user_ids, list) or not user_ids:
+            return Response(
+                {"detail": "No user IDs provided."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        hostel_ids = request.data.get('hostel_ids')
+        if hostel_ids is not None and not isinstance(hostel_ids, list):
+            return Response(
+                {"detail": "hostel_ids must be a list of hostel IDs."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        def flag(name, default):
+            return str(request.data.get(name, default)).lower() in ['true', '1']
+
+        try:
+            report = Occupancy.allocate(
+                user_ids,
+                hostel_ids=hostel_ids,
+                keep_friends=flag('keep_friends', True),
+                group_by_year=flag('group_by_year', True),
+                dry_run=flag('dry_run', False),
+            )
+        except IntegrityError:
+            return Response(
+                {"detail": "Some of these users were assigned concurrently. Please retry."},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(report)
+
+    @action(detail=True, methods=['post'])
+    def checkout(self, request, pk=None):
+        """
+        Checks out every current resident of the hostel, e.g. at semester end
+        (admin only). Optional "floor" or "room_ids" narrow the scope and
+        "date" (YYYY-MM-DD, default today) is recorded as the move-out date
+        """
+        if request.user.user_type not in ['developer', 'maintainer']:
+            return Response(
+                {"detail": "You do not have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        hostel = self.get_object()
+        rooms = Room.objects.filter(hostel=hostel)
+
+        floor = request.data.get('floor')
+        room_ids = request.data.get('room_ids')
+        if floor is not None:
+            if not isinstance(floor, int):
+                return Response(
+                    {"detail": "floor must be a number."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            rooms = rooms.filter(floor=floor)
+        if room_ids is not None:
+            if not isinstance(room_ids, list) or not room_ids:
+                return Response(
+                    {"detail": "room_ids must be a non-empty list of room IDs."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            rooms = rooms.filter(id__in=room_ids)
+
+        day = date.today()
+        if request.data.get('date') is not None:
+            try:
+                day = parse_date(str(request.data['date']))
+            except ValueError:  # Well formed but not a real date
+                day = None
+            if day is None:
+                return Response(
+                    {"detail": "date must be a date in YYYY-MM-DD format."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        return Response(Occupancy.checkout(rooms, day))
+
     @action(detail=True, methods=['get'])
     def residents(self, request, pk=None):
         """
@@ -180,6 +383,26 @@ class HostelViewSet(viewsets.ModelViewSet):
         
         return Response(residents)
 
+    @action(detail=True, methods=['get'], url_path='residents/export')
+    def export_residents(self, request, pk=None):
+        """
+        Streams the current residents of a hostel as CSV or NDJSON (?output=)
+        """
+        hostel = self.get_object()
+        return export_response(
+            request,
+            Occupancy.objects.current().filter(room__hostel=hostel),
+            {
+                'id_no': 'occupant_id',
+                'name': 'occupant__name',
+                'email': 'occupant__email',
+                'room_number': 'room__room_number',
+                'room_id': 'room_id',
+                'from_date': 'from_date',
+            },
+            f'{hostel.hostel_name}-residents'
+        )
+
     @action(detail=True, methods=['post'])
     def create_rooms(self, request, pk=None):
         """
@@ -192,31 +415,56 @@ class HostelViewSet(viewsets.ModelViewSet):
             )
             
         hostel = self.get_object()
-        room_count = request.data.get('room_count', 0)
-        starting_number = request.data.get('starting_number', 1)
         
-        if room_count <= 0:
-            return Response(
-                {"detail": "Invalid room count."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        if 'layout' in request.data:
+            # Layout spec: blocks, floors, rooms per floor and a numbering pattern
+            layout = RoomLayoutSerializer(data=request.data['layout'])
+            layout.is_valid(raise_exception=True)
+            room_numbers = layout.validated_data['room_numbers']
+            floors = dict(layout.validated_data['rooms'])
+            capacity = layout.validated_data['capacity']
+        else:
+            # Sequential numbering from starting_number
+            room_count = request.data.get('room_count', 0)
+            starting_number = request.data.get('starting_number', 1)
             
-        created_rooms = []
+            if room_count <= 0:
+                return Response(
+                    {"detail": "Invalid room count."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if room_count > RoomLayoutSerializer.MAX_ROOMS:
+                return Response(
+                    {"detail": f"At most {RoomLayoutSerializer.MAX_ROOMS} rooms can be created at once."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            room_numbers = [str(starting_number + i) for i in range(room_count)]
+            floors = {}
+            capacity = request.data.get('capacity', 1)
+            if not isinstance(capacity, int) or capacity <= 0:
+                return Response(
+                    {"detail": "Invalid capacity."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
-        for i in range(room_count):
-            room_number = str(starting_number + i)
-            room, created = Room.objects.get_or_create(
-                hostel=hostel,
-                room_number=room_number
-            )
-            created_rooms.append({
-                'id': room.id,
-                'room_number': room.room_number,
-                'created': created
-            })
+        # Insert only the missing rooms in one statement; conflicts from
+        # concurrent requests are skipped by the unique (hostel, room_number) key
+        existing = set(Room.objects.filter(
+            hostel=hostel, room_number__in=room_numbers
+        ).values_list('room_number', flat=True))
+        new_rooms = [
+            Room(hostel=hostel, room_number=room_number, floor=floors.get(room_number), capacity=capacity)
+            for room_number in room_numbers if room_number not in existing
+        ]
+        Room.objects.bulk_create(new_rooms, batch_size=1000, ignore_conflicts=True)
+        invalidate_occupancy_dashboard()
         
         return Response({
-            'created_rooms': created_rooms
+            'requested': len(room_numbers),
+            'created': len(new_rooms),
+            'existing': len(existing),
+            'first_room': room_numbers[0],
+            'last_room': room_numbers[-1],
         })
 
 
@@ -236,12 +484,41 @@ class RoomViewSet(viewsets.ModelViewSet):
         """
         Optionally filter rooms by hostel
         """
-        queryset = Room.objects.all()
+        queryset = Room.objects.select_related('hostel')
         hostel_id = self.request.query_params.get('hostel', None)
         if hostel_id is not None:
             queryset = queryset.filter(hostel_id=hostel_id)
         return queryset
     
+    @action(detail=False, methods=['get'])
+    def vacant(self, request):
+        """
+        Returns rooms with free beds, optionally filtered by hostel and
+        a minimum number of free beds, using the occupied beds counter
+        """
+        try:
+            min_beds = max(1, int(request.query_params.get('min_beds', 1)))
+        except ValueError:
+            return Response(
+                {"detail": "min_beds must be a number."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # The columns are unsigned, so the comparison avoids subtracting
+        # them in SQL, which fails on MySQL for overbooked rooms
+        rooms = Room.objects.filter(capacity__gte=F('occupied_beds') + min_beds)
+        
+        hostel_id = request.query_params.get('hostel', None)
+        if hostel_id is not None:
+            rooms = rooms.filter(hostel_id=hostel_id)
+        
+        rows = list(rooms.order_by('hostel_id', 'room_number').values(
+            'id', 'hostel', 'hostel__hostel_name', 'room_number', 'capacity', 'occupied_beds'
+        ))
+        for row in rows:
+            row['free_beds'] = row['capacity'] - row['occupied_beds']
+        return Response(rows)
+    
     @action(detail=True, methods=['get'])
     def occupants(self, request, pk=None):
         """
@@ -250,6 +527,45 @@ class RoomViewSet(viewsets.ModelViewSet):
         room = self.get_object()
         serializer = RoomWithOccupantsSerializer(room)
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """
+        Returns the stays in a room, newest first. ?date=YYYY-MM-DD limits them
+        to who lived in the room on that day, ?from= and ?to= to the stays
+        overlapping that period (admin only)
+        """
+        if request.user.user_type not in ['developer', 'maintainer']:
+            return Response(
+                {"detail": "You do not have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        room = self.get_object()
+        stays = Occupancy.objects.filter(room=room)
+        
+        params = {}
+        for name in ['date', 'from', 'to']:
+            value = request.query_params.get(name)
+            if value is not None:
+                try:
+                    params[name] = parse_date(value)
+                except ValueError:  # Well formed but not a real date
+                    params[name] = None
+                if params[name] is None:
+                    return Response(
+                        {"detail": f"{name} must be a date in YYYY-MM-DD format."},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+        
+        if 'date' in params:
+            stays = stays.on_date(params['date'])
+        elif 'from' in params or 'to' in params:
+            stays = stays.overlapping(params.get('from', date.min), params.get('to', date.max))
+        
+        return Response(list(stays.order_by('-from_date', '-id').values(
+            'id', 'occupant_id', 'occupant__name', 'from_date', 'to_date'
+        )))
 
 
 class OccupancyViewSet(viewsets.ModelViewSet):
@@ -280,4 +596,21 @@ class OccupancyViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.user_type in ['developer', 'maintainer']:
             return Occupancy.objects.all()
-        return Occupancy.objects.filter(occupant=user)
\ No newline at end of file
+        return Occupancy.objects.filter(occupant=user)
+    
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """
+        Returns the room history of a student, newest stay first.
+        Admins may pass ?user=<id_no>; other users get their own history
+        """
+        user_id = request.user.id_no
+        if request.user.user_type in ['developer', 'maintainer']:
+            user_id = request.query_params.get('user', user_id)
+        
+        return Response(list(Occupancy.objects.filter(occupant_id=user_id).order_by(
+            '-from_date', '-id'
+        ).values(
+            'id', 'room_id', 'room__room_number', 'room__hostel_id', 'room__hostel__hostel_name',
+            'from_date', 'to_date'
+        )))
\ No newline at end of file
@@ -19,6 +19,7 @@ ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(','
 
 # Application definition
 INSTALLED_APPS = [
+    'daphne',  # Serves the ASGI application (HTTP and WebSockets) for runserver
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'corsheaders',
     'rest_framework_simplejwt',
+    'channels',
     
     # Local apps
     'api',
@@ -65,6 +67,37 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'campus_sphere.wsgi.application'
+ASGI_APPLICATION = 'campus_sphere.asgi.application'
+
+# Channel layer used to fan out real-time chat events between processes,
+# and the cache used for computed summaries. The in-memory backends only work
+# within a single process; set REDIS_URL to use Redis when running more than
+# one worker.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        },
+    }
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
 
 # Database
 DATABASES = {
@@ -143,4 +176,30 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
     'USER_ID_FIELD': 'id_no',  # Use the custom primary key field
     'USER_ID_CLAIM': 'user_id',
-}
\ No newline at end of file
+}
+
+# Chat message history pagination
+CHAT_MESSAGE_PAGE_SIZE = int(os.environ.get('CHAT_MESSAGE_PAGE_SIZE', '50'))
+CHAT_MESSAGE_MAX_PAGE_SIZE = int(os.environ.get('CHAT_MESSAGE_MAX_PAGE_SIZE', '200'))
+# Longest time (seconds) messages/poll/ holds a request open waiting for new messages
+CHAT_LONG_POLL_TIMEOUT = int(os.environ.get('CHAT_LONG_POLL_TIMEOUT', '25'))
+
+# Seconds a computed hostel occupancy dashboard stays cached; any occupancy
+# change invalidates it earlier
+HOSTEL_DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('HOSTEL_DASHBOARD_CACHE_TIMEOUT', '300'))
+
+# Rows fetched per query by the streaming CSV/NDJSON roster exports
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+
+# Seconds a user's club membership/role map is cached for permission checks;
+# membership changes invalidate it earlier. 0 keeps it per request only,
+# the default without Redis: invalidating the per-process cache would not
+# reach the other workers, so revoked roles could stay valid there
+CLUB_ROLES_CACHE_TIMEOUT = int(os.environ.get('CLUB_ROLES_CACHE_TIMEOUT', '60' if REDIS_URL else '0'))
+
+# Seat counters per capped event; registrations claim seats on a random one
+# so a popular event does not serialize on a single counter row
+EVENT_SEAT_COUNTER_SHARDS = int(os.environ.get('EVENT_SEAT_COUNTER_SHARDS', '8'))
+
+# Largest batch accepted by the bulk event check-in endpoint
+EVENT_CHECK_IN_MAX_BATCH = int(os.environ.get('EVENT_CHECK_IN_MAX_BATCH', '5000'))
@@ -42,6 +42,8 @@ const ClubDetail = () => {
   
   const [club, setClub] = useState(null);
   const [members, setMembers] = useState([]);
+  const [membersCount, setMembersCount] = useState(0);
+  const [nextRosterPage, setNextRosterPage] = useState(null);
   const [isMember, setIsMember] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -63,12 +65,12 @@ const ClubDetail = () => {
       try {
         const [clubResponse, membersResponse, myClubsResponse] = await Promise.all([
           clubService.getClubById(clubId),
-          clubService.getClubMembers(clubId),
+          clubService.getClubRoster(clubId),
           clubService.getMyClubs(),
         ]);
         
         setClub(clubResponse.data);
-        setMembers(membersResponse.data.members || []);
+        setRoster(membersResponse.data);
         
         // Check if current user is a member
         const userClubs = myClubsResponse.data.map(c => c.club_id);
@@ -92,6 +94,25 @@ const ClubDetail = () => {
     fetchData();
   }, [clubId]);
   
+  // Replace the member list with the first roster page
+  const setRoster = (page) => {
+    setMembers(page.results || []);
+    setMembersCount(page.count || 0);
+    setNextRosterPage(page.next ? 2 : null);
+  };
+  
+  // Append the next roster page
+  const handleLoadMoreMembers = async () => {
+    try {
+      const membersResponse = await clubService.getClubRoster(clubId, { page: nextRosterPage });
+      setMembers([...members, ...(membersResponse.data.results || [])]);
+      setNextRosterPage(membersResponse.data.next ? nextRosterPage + 1 : null);
+    } catch (err) {
+      console.error('Loading members failed:', err);
+      setError('Failed to load more members. Please try again.');
+    }
+  };
+  
   // Handle club joining
   const handleJoin = async () => {
     try {
@@ -99,8 +120,8 @@ const ClubDetail = () => {
       setIsMember(true);
       
       // Refresh members list
-      const membersResponse = await clubService.getClubMembers(clubId);
-      setMembers(membersResponse.data.members || []);
+      const membersResponse = await clubService.getClubRoster(clubId);
+      setRoster(membersResponse.data);
       
       setSuccess('Successfully joined the club.');
       
@@ -126,8 +147,8 @@ const ClubDetail = () => {
       setIsMember(false);
       
       // Refresh members list
-      const membersResponse = await clubService.getClubMembers(clubId);
-      setMembers(membersResponse.data.members || []);
+      const membersResponse = await clubService.getClubRoster(clubId);
+      setRoster(membersResponse.data);
       
       setSuccess('Successfully left the club.');
       
@@ -313,7 +334,7 @@ const ClubDetail = () => {
           <Box sx={{ mt: 3 }}>
             <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', mb: 2 }}>
               <Typography variant="h6" component="h2">
-                Members ({members.length})
+                Members ({membersCount})
               </Typography>
               
               {isMember ? (
@@ -364,7 +385,7 @@ const ClubDetail = () => {
                             >
                               ID: {member.id_no}
                             </Typography>
-                            {member.email && ` — ${member.email}`}
+                            {member.role && ` — ${member.role}`}
                           </>
                         }
                       />
@@ -374,6 +395,14 @@ const ClubDetail = () => {
                 ))}
               </List>
             )}
+            
+            {nextRosterPage && (
+              <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+                <Button variant="text" onClick={handleLoadMoreMembers}>
+                  Load more members
+                </Button>
+              </Box>
+            )}
           </Box>
         </Paper>
       </Box>
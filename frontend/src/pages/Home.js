@@ -47,13 +47,13 @@ const Dashboard = () => {
         ] = await Promise.all([
           courseService.getAllCourses(),
           clubService.getUserClubs(),
-          eventService.getAllEvents({ from_date: new Date().toISOString() }),
+          eventService.getFeed({ page_size: 3 }),
         ]);
         
         setData({
           courses: coursesResponse.data.slice(0, 3),
           clubs: clubsResponse.data.slice(0, 3),
-          events: eventsResponse.data.slice(0, 3),
+          events: eventsResponse.data.results.map((entry) => entry.event),
           loading: false,
         });
       } catch (error) {
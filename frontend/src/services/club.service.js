@@ -17,6 +17,11 @@ const clubService = {
     return api.get(`/clubs/${name}/members/`);
   },
   
+  // Get a page of the club member roster (params: page, page_size, role, ordering)
+  getClubRoster: async (name, params = {}) => {
+    return api.get(`/clubs/${name}/roster/`, { params });
+  },
+  
   // Create club (admin only)
   createClub: async (clubData) => {
     return api.post('/clubs/', clubData);
@@ -6,6 +6,11 @@ const eventService = {
     return api.get('/events/');
   },
   
+  // Get the current user's upcoming events feed, best ranked first
+  getFeed: async (params = {}) => {
+    return api.get('/events/feed/', { params });
+  },
+  
   // Get event by ID
   getEventById: async (id) => {
     return api.get(`/events/${id}/`);